@@ -0,0 +1,91 @@
+class BucketQueue:
+    """
+    優先度が小さい非負整数であることを利用した優先度付きキュー(バケットキュー)
+    buckets[優先度][タイブレーク値] に要素を積み、最小の優先度から順に取り出す
+    同じキーの要素を再度追加すると、古い要素は無効になる(decrease-key)
+    無効になった要素は取り出す時に読み飛ばす
+    """
+
+    def __init__(self):
+        """
+        バケットキューの初期化
+            buckets = 優先度ごとの、タイブレーク値ごとの(キー, 要素)のリスト
+            entries = キーごとの有効な要素
+            minimum = 空でない可能性のある最小の優先度
+            stale_pops = 読み飛ばした無効な要素の数
+        """
+        self.buckets = []
+        self.entries = {}
+        self.minimum = 0
+        self.stale_pops = 0
+
+    def __len__(self):
+        """
+        有効な要素の数を返す
+        """
+        return len(self.entries)
+
+    def __contains__(self, key):
+        """
+        キーの要素がキューに入っているかどうかを判定する
+        """
+        return key in self.entries
+
+    def get(self, key):
+        """
+        キーの有効な要素を返す(なければNone)
+        """
+        return self.entries.get(key)
+
+    def push(self, key, item, priority, tie=0):
+        """
+        要素を追加する
+        1. 同じキーの要素が既にあれば、その要素は無効になる
+        2. 優先度とタイブレーク値のバケットに積む
+        """
+        self.entries[key] = item
+        buckets = self.buckets
+        while len(buckets) <= priority:
+            buckets.append([])
+        ties = buckets[priority]
+        while len(ties) <= tie:
+            ties.append([])
+        ties[tie].append((key, item))
+        if priority < self.minimum:
+            self.minimum = priority
+
+    def pop(self):
+        """
+        優先度が最小の要素を取り出す
+        優先度が同じ場合はタイブレーク値が小さいものを、それも同じ場合は後から追加したものを優先する
+        """
+        buckets = self.buckets
+        entries = self.entries
+        while self.minimum < len(buckets):
+            for bucket in buckets[self.minimum]:
+                while bucket:
+                    key, item = bucket.pop()
+                    if entries.get(key) is item:
+                        del entries[key]
+                        return item
+                    self.stale_pops += 1
+            self.minimum += 1
+        raise IndexError("pop from an empty bucket queue")
+
+    def peek_priority(self):
+        """
+        最小の優先度を、要素を取り出さずに返す(空ならNone)
+        途中で見つけた無効な要素は取り除く
+        """
+        buckets = self.buckets
+        entries = self.entries
+        while self.minimum < len(buckets):
+            for bucket in buckets[self.minimum]:
+                while bucket:
+                    key, item = bucket[-1]
+                    if entries.get(key) is item:
+                        return self.minimum
+                    bucket.pop()
+                    self.stale_pops += 1
+            self.minimum += 1
+        return None
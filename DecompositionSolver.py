@@ -0,0 +1,285 @@
+import heapq
+from collections import deque
+
+from Node import Node
+
+
+class DecompositionSolver:
+    """
+    大きな盤面(6x6以上)のための、手数が最適とは限らない高速な解法
+    螺旋状のゴールの順(外周の上の行、右の列、下の行、左の列、その内側の周、…)にタイルを1枚ずつ置いていく。
+    1. 置いたタイルは固定し、以降の探索では動かさない
+    2. 1枚のタイルを置く探索は、そのタイルと空白マスの位置だけを状態とする小さなA*探索になる
+    3. 各辺の最後の2枚は、そのまま置くと置いたタイルを崩す必要があるため、
+       最後のタイルを1つ手前の位置に、手前のタイルをその内側に置いてから、2手で回し入れる
+    4. 残りのマスがREGION_LIMIT以下になったら、残りの盤面を幅優先探索で揃える
+    5. 部分問題の手順をつなぐと、続けて打ち消し合う手(UとDなど)が入るので、最後に取り除く
+    """
+
+    # 最後にまとめて幅優先探索で揃えるマスの数
+    REGION_LIMIT = 6
+
+    def __init__(self, goal):
+        """
+        解法の初期化
+            goal = ゴール状態
+            goal_tiles = マスごとのゴールのタイル
+            move_table = 空白マスの位置ごとの、動かせる方向と動かした後の位置(Node.get_move_tableを参照)
+            opened_states = 部分問題の探索で展開した状態の数の合計
+            max_states = 部分問題の探索で保持した状態の数の最大値
+        """
+        self.goal = goal
+        self.size = goal.size
+        self.goal_tiles = [tile for row in goal.goal_puzzle for tile in row]
+        self.move_table = Node.get_move_table(goal.size)
+        self.opened_states = 0
+        self.max_states = 0
+
+    def get_segments(self, ring):
+        """
+        ring番目の周の4つの辺を、螺旋状のゴールと同じ順に返す
+        各辺は (マスのリスト, 周の内側への向き(di, dj))
+        """
+        size = self.size
+        first = ring
+        last = size - 1 - ring
+        return [
+            ([first * size + j for j in range(first, last + 1)], (1, 0)),
+            ([i * size + last for i in range(first + 1, last + 1)], (0, -1)),
+            ([last * size + j for j in range(last - 1, first - 1, -1)], (-1, 0)),
+            ([i * size + first for i in range(last - 1, first, -1)], (0, 1)),
+        ]
+
+    def solve(self, puzzle):
+        """
+        パズル(行のタプル)を解き、手順の文字列を返す(解けない場合はNone)
+        """
+        self.tiles = [tile for row in puzzle for tile in row]
+        self.blank = self.tiles.index(0)
+        self.moves = []
+        locked = set()
+        cells = self.size * self.size
+
+        for ring in range((self.size + 1) // 2):
+            for segment, inward in self.get_segments(ring):
+                if cells - len(locked) <= DecompositionSolver.REGION_LIMIT:
+                    return self.solve_region(locked)
+                if not segment:
+                    continue
+                for target in segment[:-2]:
+                    self.place_tile(self.goal_tiles[target], target, locked)
+                    locked.add(target)
+                if len(segment) == 1:
+                    self.place_tile(self.goal_tiles[segment[0]], segment[0], locked)
+                    locked.add(segment[0])
+                else:
+                    self.place_last_two(segment[-2], segment[-1], inward, locked)
+        return self.solve_region(locked)
+
+    def apply(self, moves):
+        """
+        手順を盤面に適用し、解の手順に加える
+        """
+        size = self.size
+        tiles = self.tiles
+        for move in moves:
+            di, dj = Node.DIRECTIONS[move]
+            target = self.blank + di * size + dj
+            tiles[self.blank], tiles[target] = tiles[target], 0
+            self.blank = target
+        self.moves.extend(moves)
+
+    def get_distance(self, cell, other):
+        """
+        2つのマスのマンハッタン距離
+        """
+        i, j = divmod(cell, self.size)
+        other_i, other_j = divmod(other, self.size)
+        return abs(i - other_i) + abs(j - other_j)
+
+    def place_tile(self, tile, target, locked):
+        """
+        固定したマス(locked)を動かさずに、tileをtargetに動かす
+        """
+        self.place_tiles(((tile, target),), locked)
+
+    def place_tiles(self, placements, locked):
+        """
+        固定したマス(locked)を動かさずに、各タイルをそれぞれの目標のマスに動かす(A*探索)
+            placements = (タイル, 目標のマス) の組のタプル
+        状態: (タイルの位置のタプル, 空白マスの位置)
+        推定コスト: 各タイルを動かす回数(目標のマスとの距離)の合計
+                    + 空白マスが目標にないタイルの隣に来るまでの回数
+        """
+        targets = tuple(target for _, target in placements)
+        start = (tuple(self.tiles.index(tile) for tile, _ in placements), self.blank)
+        if start[0] == targets:
+            return
+
+        def estimate(positions, blank):
+            distance = 0
+            approach = None
+            for position, target in zip(positions, targets):
+                if position != target:
+                    distance += self.get_distance(position, target)
+                    to_tile = self.get_distance(blank, position) - 1
+                    if approach is None or to_tile < approach:
+                        approach = to_tile
+            return distance + max(0, approach or 0)
+
+        parents = {start: None}
+        open_list = [(estimate(*start), 0, start)]
+        while open_list:
+            _, cost, state = heapq.heappop(open_list)
+            positions, blank = state
+            if positions == targets:
+                break
+            self.opened_states += 1
+            for move, cell in self.move_table[blank]:
+                if cell in locked:
+                    continue
+                if cell in positions:
+                    next_positions = tuple(
+                        blank if position == cell else position for position in positions
+                    )
+                else:
+                    next_positions = positions
+                next_state = (next_positions, cell)
+                if next_state not in parents:
+                    parents[next_state] = (state, move)
+                    heapq.heappush(
+                        open_list,
+                        (cost + 1 + estimate(*next_state), cost + 1, next_state),
+                    )
+        else:
+            raise ValueError(f"tiles {placements} cannot be placed")
+        self.max_states = max(self.max_states, len(parents))
+
+        moves = []
+        while parents[state] is not None:
+            state, move = parents[state]
+            moves.append(move)
+        moves.reverse()
+        self.apply(moves)
+
+    def move_blank(self, target, blocked):
+        """
+        blockedのマスを通らずに、空白マスをtargetに動かす(幅優先探索)
+        """
+        parents = {self.blank: None}
+        queue = deque([self.blank])
+        while queue:
+            blank = queue.popleft()
+            if blank == target:
+                break
+            self.opened_states += 1
+            for move, cell in self.move_table[blank]:
+                if cell not in blocked and cell not in parents:
+                    parents[cell] = (blank, move)
+                    queue.append(cell)
+        else:
+            raise ValueError(f"the blank cannot reach cell {target}")
+        self.max_states = max(self.max_states, len(parents))
+
+        moves = []
+        while parents[blank] is not None:
+            blank, move = parents[blank]
+            moves.append(move)
+        moves.reverse()
+        self.apply(moves)
+
+    def place_last_two(self, first, last, inward, locked):
+        """
+        辺の最後の2マス(first, last)を揃える
+        1. lastのタイルをfirstに置く
+        2. firstのタイルを、firstの内側のマスに置く
+        3. 空白マスを、2枚のタイルを動かさずにlastに動かす
+        4. 空白マスをfirst、内側のマスの順に動かすと、2枚のタイルがそれぞれのマスに入る
+        firstのタイルが角(last)やその内側に閉じ込められて2.や3.ができない場合は、
+        lastのタイルの固定を外し、2枚のタイルをまとめて動かす探索で揃える
+        """
+        tiles = self.tiles
+        first_tile = self.goal_tiles[first]
+        last_tile = self.goal_tiles[last]
+        if tiles[first] == first_tile and tiles[last] == last_tile:
+            locked.update((first, last))
+            return
+
+        size = self.size
+        inner = first + inward[0] * size + inward[1]
+        self.place_tile(last_tile, first, locked)
+        locked.add(first)
+        try:
+            self.place_tile(first_tile, inner, locked)
+            self.move_blank(last, locked | {inner})
+        except ValueError:
+            # 失敗した探索は盤面を動かさないので、そのままの盤面からまとめて探索する
+            locked.remove(first)
+            self.place_tiles(((first_tile, first), (last_tile, last)), locked)
+        else:
+            self.apply([self.get_move(last, first), self.get_move(first, inner)])
+        locked.update((first, last))
+
+    def get_move(self, blank, target):
+        """
+        空白マスをblankから隣のtargetに動かす手(U/D/L/R)を返す
+        """
+        for move, cell in self.move_table[blank]:
+            if cell == target:
+                return move
+        raise ValueError(f"cells {blank} and {target} are not adjacent")
+
+    def solve_region(self, locked):
+        """
+        固定していないマスだけを動かして、残りの盤面を幅優先探索で揃え、解の手順を返す
+        状態: 固定していないマスのタイルの並び(空白マスを含む)
+        """
+        free_cells = [
+            cell for cell in range(self.size * self.size) if cell not in locked
+        ]
+        index = {cell: position for position, cell in enumerate(free_cells)}
+        start = tuple(self.tiles[cell] for cell in free_cells)
+        goal = tuple(self.goal_tiles[cell] for cell in free_cells)
+
+        parents = {start: None}
+        queue = deque([(start, self.blank)])
+        while queue:
+            state, blank = queue.popleft()
+            if state == goal:
+                break
+            self.opened_states += 1
+            for move, cell in self.move_table[blank]:
+                if cell in locked:
+                    continue
+                next_state = list(state)
+                next_state[index[blank]] = state[index[cell]]
+                next_state[index[cell]] = 0
+                next_state = tuple(next_state)
+                if next_state not in parents:
+                    parents[next_state] = (state, move)
+                    queue.append((next_state, cell))
+        else:
+            return None
+        self.max_states = max(self.max_states, len(parents))
+
+        moves = []
+        while parents[state] is not None:
+            state, move = parents[state]
+            moves.append(move)
+        moves.reverse()
+        self.apply(moves)
+        return self.cancel_moves(self.moves)
+
+    @staticmethod
+    def cancel_moves(moves):
+        """
+        手順から、続けて打ち消し合う手の組(UとD、LとR)を、なくなるまで取り除いた文字列を返す
+        (取り除いた組の前後が新しく打ち消し合う組になる場合も、スタックで一度に取り除ける)
+        """
+        result = []
+        for move in moves:
+            if result and result[-1] == Node.INVERSE_MOVES[move]:
+                result.pop()
+            else:
+                result.append(move)
+        return "".join(result)
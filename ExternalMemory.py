@@ -0,0 +1,165 @@
+import heapq
+import mmap
+import os
+
+
+def get_record_size(size):
+    """
+    1つの状態をファイルに書き出す時のバイト数
+    4x4以下は詰めた整数(64ビット以下)を8バイト、5x5以上はbytesの状態をそのまま書き出す
+    """
+    return 8 if size <= 4 else size * size
+
+
+def encode_state(state):
+    """
+    状態を固定長のバイト列にする
+    整数はビッグエンディアンにして、バイト列の順序と整数の大小が一致するようにする
+    """
+    if isinstance(state, int):
+        return state.to_bytes(8, "big")
+    return state
+
+
+def decode_state(record, size):
+    """
+    encode_stateで書き出したバイト列を状態に戻す
+    """
+    if size <= 4:
+        return int.from_bytes(record, "big")
+    return bytes(record)
+
+
+class LayerFile:
+    """
+    ソート済みで重複のない状態のファイル(1つの層)
+    ファイルをメモリマップし、先頭から順に読むか、二分探索で状態が含まれるかを判定する
+    """
+
+    def __init__(self, path, record_size):
+        """
+        層のファイルを開く
+            path = ファイルのパス
+            record_size = 1つの状態のバイト数
+            count = 状態の数
+        """
+        self.path = path
+        self.record_size = record_size
+        self.count = os.path.getsize(path) // record_size
+        self.map = None
+        if self.count:
+            with open(path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """
+        状態(バイト列)をソート順に返す
+        """
+        record_size = self.record_size
+        for offset in range(0, self.count * record_size, record_size):
+            yield self.map[offset : offset + record_size]
+
+    def __contains__(self, record):
+        """
+        状態(バイト列)が含まれるかどうかを二分探索で判定する
+        """
+        record_size = self.record_size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * record_size
+            value = self.map[offset : offset + record_size]
+            if value == record:
+                return True
+            if value < record:
+                low = middle + 1
+            else:
+                high = middle
+        return False
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def delete(self):
+        self.close()
+        os.remove(self.path)
+
+
+class LayerWriter:
+    """
+    次の層の状態を集め、遅延重複検出(delayed duplicate detection)で重複を除いて層のファイルにする
+    1. 生成した状態をメモリ上の集合にためる
+    2. 集合がcapacityを超えたら、ソートしてランファイルとしてディスクに書き出す
+    3. 最後に全てのランファイルを併合し、重複と、除外する層にある状態を取り除いて書き出す
+    """
+
+    def __init__(self, path, record_size, capacity):
+        """
+        層の書き出しの初期化
+            path = 書き出す層のファイルのパス(ランファイルは path.run<番号> に書き出す)
+            record_size = 1つの状態のバイト数
+            capacity = メモリ上にためる状態の数の上限
+            buffer = メモリ上にためている状態の集合
+            runs = 書き出したランファイルのパス
+            peak = メモリ上にためた状態の数の最大値
+        """
+        self.path = path
+        self.record_size = record_size
+        self.capacity = capacity
+        self.buffer = set()
+        self.runs = []
+        self.peak = 0
+
+    def add(self, record):
+        """
+        状態(バイト列)を加える
+        """
+        buffer = self.buffer
+        buffer.add(record)
+        if len(buffer) >= self.capacity:
+            self.spill()
+
+    def spill(self):
+        """
+        メモリ上の状態をソートして、ランファイルに書き出す
+        """
+        self.peak = max(self.peak, len(self.buffer))
+        run_path = f"{self.path}.run{len(self.runs)}"
+        with open(run_path, "wb") as f:
+            f.write(b"".join(sorted(self.buffer)))
+        self.runs.append(run_path)
+        self.buffer = set()
+
+    def finish(self, excluded=None):
+        """
+        ランファイルとメモリ上の状態を併合して層のファイルを書き出し、LayerFileとして返す
+        excluded(LayerFile)にある状態は書き出さない(ソート順に並んでいるので、並べて読み進めるだけで判定できる)
+        """
+        self.peak = max(self.peak, len(self.buffer))
+        runs = [LayerFile(run_path, self.record_size) for run_path in self.runs]
+        sources = [iter(run) for run in runs] + [iter(sorted(self.buffer))]
+        self.buffer = set()
+
+        excluded_records = iter(excluded) if excluded is not None else iter(())
+        excluded_record = next(excluded_records, None)
+        previous = None
+        with open(self.path, "wb") as f:
+            for record in heapq.merge(*sources):
+                if record == previous:
+                    continue
+                previous = record
+                while excluded_record is not None and excluded_record < record:
+                    excluded_record = next(excluded_records, None)
+                if record == excluded_record:
+                    continue
+                f.write(record)
+
+        for run in runs:
+            run.delete()
+        self.runs = []
+        return LayerFile(self.path, self.record_size)
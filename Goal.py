@@ -1,13 +1,31 @@
 class Goal:
-    def __init__(self, size):
+    def __init__(self, size, goal_puzzle=None):
         """
         ゴールとなるパズルを生成する
-        goal_puzzle: ゴールとなるパズル
+        goal_puzzle: ゴールとなるパズル(指定しなければ螺旋状のパズル、
+                     置換表から手順を復元する時は途中の状態をゴールにして探索し直す)
         goal_puzzle_dic: ゴールとなるパズルの辞書形式（キー: マス目の数字, 値: マス目の座標）
+        goal_state: ゴールとなるパズルを詰めた状態(pack_puzzleを参照)
+        goal_cells: マス目の数字ごとのゴールの位置(i*size+j)
+        distance_table: マス目の数字と位置ごとのゴールまでのマンハッタン距離(空白マスは0)
         """
         self.size = size
-        self.goal_puzzle, self.goal_empty_row, self.goal_empty_col = self.get_goal_puzzle(size)
+        if goal_puzzle is None:
+            self.goal_puzzle, self.goal_empty_row, self.goal_empty_col = (
+                self.get_goal_puzzle(size)
+            )
+        else:
+            self.goal_puzzle = tuple(tuple(row) for row in goal_puzzle)
+            self.goal_empty_row, self.goal_empty_col = divmod(
+                [tile for row in self.goal_puzzle for tile in row].index(0), size
+            )
         self.goal_puzzle_dic = self.get_puzzle_dic(self.goal_puzzle)
+        self.goal_state = self.pack_puzzle(self.goal_puzzle)
+        self.goal_cells = [
+            self.goal_puzzle_dic[tile][0] * size + self.goal_puzzle_dic[tile][1]
+            for tile in range(size * size)
+        ]
+        self.distance_table = self.get_distance_table()
 
     def get_goal_puzzle(self, size):
         """
@@ -57,3 +75,94 @@ class Goal:
             for j in range(self.size):
                 goal_puzzle_dic[puzzle[i][j]] = (i, j)
         return goal_puzzle_dic
+
+    def get_distance_table(self):
+        """
+        マス目の数字ごとに、各位置からゴールの位置までのマンハッタン距離の表を作る
+        distance_table[数字][i*size+j]
+        """
+        size = self.size
+        table = []
+        for tile in range(size * size):
+            goal_i, goal_j = self.goal_puzzle_dic[tile]
+            if tile == 0:
+                table.append([0] * (size * size))
+                continue
+            table.append(
+                [abs(goal_i - i) + abs(goal_j - j) for i in range(size) for j in range(size)]
+            )
+        return table
+
+    def pack_puzzle(self, puzzle):
+        """
+        パズルを探索用の詰めた状態に変換する
+        4x4以下: 1マス4ビットの整数(マス目 i*size+j の数字が 4*(i*size+j) ビット目から入る)
+        5x5以上: 1マス1バイトのbytes
+        """
+        tiles = [cell for row in puzzle for cell in row]
+        if self.size <= 4:
+            state = 0
+            for index, tile in enumerate(tiles):
+                state |= tile << (4 * index)
+            return state
+        return bytes(tiles)
+
+    def unpack_state(self, state):
+        """
+        詰めた状態をパズル(タプルのタプル)に戻す
+        """
+        tiles = self.get_tiles(state)
+        size = self.size
+        return tuple(tuple(tiles[i * size : (i + 1) * size]) for i in range(size))
+
+    def get_tiles(self, state):
+        """
+        詰めた状態を、左上から順に並べたマス目の数字のリストにする
+        """
+        if isinstance(state, int):
+            return [(state >> (4 * index)) & 15 for index in range(self.size * self.size)]
+        return list(state)
+
+    def get_tile(self, state, cell):
+        """
+        詰めた状態から、位置(i*size+j)のマス目の数字を取り出す
+        """
+        if isinstance(state, int):
+            return (state >> (4 * cell)) & 15
+        return state[cell]
+
+    def is_solvable(self, tiles):
+        """
+        左上から順に並べたマス目の数字のリストが、ゴールにできるかどうかを判定する
+        下記の二つの偶奇が一致するかで判定する
+        ①各マス目の数字をゴールの位置へ移す置換の偶奇(n² - 巡回置換の数)
+        ②空白マスの位置とゴールの空白マスの位置のマンハッタン距離の偶奇
+        0 ~ n²-1 をちょうど1つずつ含まないものは解けないとみなす
+        """
+        cells = self.size * self.size
+        if len(tiles) != cells:
+            return False
+        goal_cells = self.goal_cells
+        permutation = [0] * cells
+        seen = bytearray(cells)
+        for cell, tile in enumerate(tiles):
+            if not 0 <= tile < cells or seen[tile]:
+                return False
+            seen[tile] = 1
+            permutation[cell] = goal_cells[tile]
+
+        cycles = 0
+        visited = bytearray(cells)
+        for start in range(cells):
+            if not visited[start]:
+                cycles += 1
+                cell = start
+                while not visited[cell]:
+                    visited[cell] = 1
+                    cell = permutation[cell]
+
+        empty_row, empty_col = divmod(tiles.index(0), self.size)
+        diff_empty = abs(empty_row - self.goal_empty_row) + abs(
+            empty_col - self.goal_empty_col
+        )
+        return (cells - cycles) % 2 == diff_empty % 2
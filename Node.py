@@ -1,58 +1,90 @@
+from bisect import bisect_left
+
+from PatternDatabase import PatternDatabase
+
+
 class Node:
     heuristic_function = "manhattan"
 
-    def __init__(self, puzzle, depth, parent, goal):
+    # ゴールの情報は全Nodeで共有する(set_goalで設定する)
+    goal = None
+    size = None
+    goal_puzzle_dic = None
+    # 空白マスの位置ごとの、動かせる方向と動かした後の空白マスの位置の組(set_goalで設定する)
+    move_table = None
+
+    # 空白マスを動かす方向(U/D/L/R)と、その逆向きの方向
+    DIRECTIONS = {"R": (0, 1), "L": (0, -1), "D": (1, 0), "U": (-1, 0)}
+    INVERSE_MOVES = {"R": "L", "L": "R", "D": "U", "U": "D"}
+
+    # サイズごとに計算済みの移動表(get_move_tableを参照)
+    _move_tables = {}
+
+    # Nodeは大量に生成されるため、インスタンスごとの__dict__を持たせない
+    __slots__ = ("state", "empty_space", "g", "h", "f", "parent", "move")
+
+    def __init__(self, state, depth, parent, empty_space=None, h=None, move=None):
         """
         Nodeの初期化
         Node: ある時点でのパズルの状態
-            goal = ゴール状態
-            size = パズルのサイズ
-            goal_puzzle_dic = ゴールのパズルの辞書
-            puzzle = パズルの状態
-            empty_space = 空きスペースの座標
+            state = パズルの状態(Goal.pack_puzzleで詰めた整数またはbytes)
+            empty_space = 空きスペースの位置(i*size+j、親Nodeから引き継ぐ)
             g = 現状のコスト(手数)
-            h = 推定コスト(ゴールと合致していないセルの数)
+            h = 推定コスト(親Nodeから差分で計算した値があればそれを使う)
             f = g + h
             parent = 親Node
+            move = 親Nodeからこの状態にするために空白マスを動かした方向(U/D/L/R)
         """
-        self.goal = goal
-        self.size = goal.size
-        self.goal_puzzle_dic = goal.goal_puzzle_dic
-        self.puzzle = puzzle
-        self.empty_space = self.find_empty_space(self.puzzle)
+        self.state = state
+        if empty_space is None:
+            empty_space = self.find_empty_space(state)
+        self.empty_space = empty_space
         self.g = depth
-        if Node.heuristic_function == "hamming":
+        if h is not None:
+            self.h = h
+        elif Node.heuristic_function == "hamming":
             self.h = self.hamming_heuristic()
         elif Node.heuristic_function == "manhattan":
             self.h = self.manhattan_heuristic()
         elif Node.heuristic_function == "linear_conflict":
             self.h = self.linear_conflict_heuristic()
+        elif Node.heuristic_function == "pattern_database":
+            self.h = self.pattern_database_heuristic()
         self.f = self.g + self.h
         self.parent = parent
+        self.move = move
 
     @staticmethod
-    def set_comparison_criteria(criteria):
+    def set_goal(goal):
         """
-        nodeの比較基準を設定する
+        全Nodeで共有するゴール状態を設定する
         """
-        Node.comparison_criteria = criteria
+        Node.goal = goal
+        Node.size = goal.size
+        Node.goal_puzzle_dic = goal.goal_puzzle_dic
+        Node.move_table = Node.get_move_table(goal.size)
 
-    def __lt__(self, other):
+    @staticmethod
+    def get_move_table(size):
         """
-        heapqでNodeをソートするための比較関数
-        f値が同じ場合は、h値が小さい方を優先する
-        f値が異なる場合は、f値が小さい方を優先する
+        空白マスの位置ごとに、動かせる方向(U/D/L/R)と動かした後の空白マスの位置の組を並べた表を返す
+        盤面の端の判定は表を作る時に一度だけ行い、サイズごとにキャッシュする
         """
-        if Node.comparison_criteria == 'g':
-            return self.g < other.g
-        elif Node.comparison_criteria == 'h':
-            return self.h < other.h
-        else:
-            if self.f == other.f:
-                return self.h < other.h
-            else:
-                return self.f < other.f
-            
+        move_table = Node._move_tables.get(size)
+        if move_table is None:
+            move_table = []
+            for empty_space in range(size * size):
+                i, j = divmod(empty_space, size)
+                move_table.append(
+                    tuple(
+                        (move, (i + di) * size + (j + dj))
+                        for move, (di, dj) in Node.DIRECTIONS.items()
+                        if 0 <= i + di < size and 0 <= j + dj < size
+                    )
+                )
+            Node._move_tables[size] = move_table
+        return move_table
+
     @staticmethod
     def set_heuristic_function(function):
         """
@@ -64,63 +96,63 @@ class Node:
         """
         パズルをハッシュ化する
         """
-        return hash(self.puzzle)
+        return hash(self.state)
 
     def __eq__(self, other):
         """
         パズルの状態が等しいかどうかを判定する
         """
-        return self.puzzle == other.puzzle
+        return self.state == other.state
 
-    def find_empty_space(self, puzzle):
+    def find_empty_space(self, state):
         """
         パズルを動かす起点となる空白マス(0)を探す
         """
-        for i, row in enumerate(puzzle):
-            for j, cell in enumerate(row):
-                if cell == 0:
-                    return (i, j)
+        return self.goal.get_tiles(state).index(0)
 
-    def is_valid_move(self, empty_space, direction):
+    @staticmethod
+    def get_child_state(state, empty_space, target):
         """
-        空白マスが動かせる方向かどうかを判定する
+        空白マスを動かした後のパズルを生成する
+        整数の場合: 動かすタイルを空白マス(値0)の位置にビット演算で移す
+        bytesの場合: 1バイトずつ入れ替える
         """
-        i, j = empty_space
-        di, dj = direction
-        return 0 <= i + di < len(self.puzzle) and 0 <= j + dj < len(self.puzzle[0])
+        if isinstance(state, int):
+            tile = (state >> (4 * target)) & 15
+            return state ^ (tile << (4 * target)) ^ (tile << (4 * empty_space))
+        child_state = bytearray(state)
+        child_state[empty_space] = child_state[target]
+        child_state[target] = 0
+        return bytes(child_state)
 
-    def get_child_puzzle(self, puzzle, empty_space, direction):
+    @staticmethod
+    def apply_move(state, empty_space, move):
         """
-        空白マスを動かした後のパズルを生成する
+        空白マスをmove(U/D/L/R)の方向に動かしたパズルと、動かした後の空白マスの位置を返す
         """
-        i, j = empty_space
-        di, dj = direction
-        child_puzzle = [list(row) for row in puzzle]
-        child_puzzle[i][j], child_puzzle[i + di][j + dj] = (
-            child_puzzle[i + di][j + dj],
-            child_puzzle[i][j],
-        )
-        return tuple(tuple(row) for row in child_puzzle)
+        di, dj = Node.DIRECTIONS[move]
+        target = empty_space + di * Node.size + dj
+        return Node.get_child_state(state, empty_space, target), target
 
     def get_children(self):
         """
         現在のNodeから、動かせる方向の子Nodeを生成する
         1. 子Nodeのリストを初期化する
-        2. ４方向でループを回す
-        3. その方向に動かせるかどうかを判定する
-        4. 動かせる場合は、その方向に動かしたパズルを生成し、子Nodeを生成してリストに追加する
+        2. 移動表から、空白マスの位置で動かせる方向でループを回す
+        3. 直前の手を戻す方向は、親Nodeの状態に戻るだけなので生成しない
+        4. その方向に動かしたパズルを生成し、子Nodeを生成してリストに追加する
         5. 子Nodeのリストを返す
         """
         children = []
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        backtrack = Node.INVERSE_MOVES.get(self.move)
 
-        for direction in directions:
-            if self.is_valid_move(self.empty_space, direction):
-                child_puzzle = self.get_child_puzzle(
-                    self.puzzle, self.empty_space, direction
-                )
-                child_node = Node(child_puzzle, self.g + 1, self, self.goal)
-                children.append(child_node)
+        for move, target in Node.move_table[self.empty_space]:
+            if move == backtrack:
+                continue
+            child_state = self.get_child_state(self.state, self.empty_space, target)
+            child_h = self.get_child_heuristic(child_state, target)
+            child_node = Node(child_state, self.g + 1, self, target, child_h, move)
+            children.append(child_node)
         return children
 
     def hamming_heuristic(self):
@@ -130,11 +162,10 @@ class Node:
         2. ゴールのパズルと比較して、異なるセルの数をカウントする
         """
         heuristic = 0
-        size = self.size
-        for i in range(size):
-            for j in range(size):
-                if (i, j) != self.goal_puzzle_dic[self.puzzle[i][j]]:
-                    heuristic += 1
+        goal_cells = self.goal.goal_cells
+        for cell, tile in enumerate(self.goal.get_tiles(self.state)):
+            if cell != goal_cells[tile]:
+                heuristic += 1
         return heuristic
 
     def manhattan_heuristic(self):
@@ -144,39 +175,106 @@ class Node:
         2. 各セルの現在の位置とゴールの位置のマンハッタン距離を計算する
         """
         heuristic = 0
-        size = self.size
-        for i in range(size):
-            for j in range(size):
-                current_value = self.puzzle[i][j]
-                if current_value != 0:
-                    goal_i, goal_j = self.goal_puzzle_dic[current_value]
-                    heuristic += abs(goal_i - i) + abs(goal_j - j)
+        distance_table = self.goal.distance_table
+        for cell, tile in enumerate(self.goal.get_tiles(self.state)):
+            heuristic += distance_table[tile][cell]
         return heuristic
 
     def linear_conflict_heuristic(self):
         """
         リニアコンフリクトを考慮したヒューリスティック関数
-        リニアコンフリクト: ２つのタイルが同じ行または列にあり、正しい位置に並んでいない場合
+        リニアコンフリクト: ２つのタイルが同じ行または列にあり、ゴールでもその行(列)にあるが、順番が逆になっている場合
         1. マンハッタン距離を計算する
-        2. リニアコンフリクトを考慮して、マンハッタン距離を修正する
+        2. 各行・各列で、行(列)から一度外れる必要があるタイルの数だけ、2手ずつ加える
         """
         heuristic = self.manhattan_heuristic()
+        for line in range(self.size):
+            heuristic += 2 * self.count_line_conflicts(self.state, line, True)
+            heuristic += 2 * self.count_line_conflicts(self.state, line, False)
+        return heuristic
+
+    def count_line_conflicts(self, state, line, is_row):
+        """
+        1つの行(または列)の中で、行(列)から一度外れる必要があるタイルの数を数える
+        1. ゴールでもその行(列)にあるタイルについて、ゴールでの並び順の列を作る
+        2. その列の最長増加部分列に入らないタイルは、他のタイルを避けるために行(列)から外れる必要がある
+        """
         size = self.size
-        for i in range(size):
-            row = self.puzzle[i]
-            for j in range(size):
-                if row[j] != 0:
-                    goal_i, goal_j = self.goal_puzzle_dic[row[j]]
-                    if goal_i == i:
-                        for k in range(j + 1, size):
-                            if row[k] != 0:
-                                goal_k, _ = self.goal_puzzle_dic[row[k]]
-                                if goal_k == i and goal_j > goal_k:
-                                    heuristic += 2
-                    if goal_j == j:
-                        for k in range(i + 1, size):
-                            if self.puzzle[k][j] != 0:
-                                goal_k, _ = self.goal_puzzle_dic[self.puzzle[k][j]]
-                                if goal_k == j and goal_i > goal_k:
-                                    heuristic += 2
-        return heuristic
\ No newline at end of file
+        goal = self.goal
+        sequence = []
+        for k in range(size):
+            cell = line * size + k if is_row else k * size + line
+            tile = goal.get_tile(state, cell)
+            if tile != 0:
+                goal_i, goal_j = self.goal_puzzle_dic[tile]
+                if is_row and goal_i == line:
+                    sequence.append(goal_j)
+                elif not is_row and goal_j == line:
+                    sequence.append(goal_i)
+
+        tails = []
+        for value in sequence:
+            index = bisect_left(tails, value)
+            if index == len(tails):
+                tails.append(value)
+            else:
+                tails[index] = value
+        return len(sequence) - len(tails)
+
+    def get_child_heuristic(self, child_state, target):
+        """
+        子Nodeのヒューリスティック値を、親Node(self)のh値からの差分で計算する
+        動くのは位置targetから空白マスへ移るタイル1枚だけなので、
+        1. マンハッタン距離: そのタイルの移動前後の距離の差だけ変わる
+        2. ハミング距離: そのタイルと空白マスの2マス分だけ変わる
+        3. リニアコンフリクト: 上記に加えて、そのタイルが出入りする行(列)の衝突だけ数え直す
+        差分で計算できないヒューリスティック関数の場合はNoneを返す
+        """
+        goal = self.goal
+        empty_space = self.empty_space
+        tile = goal.get_tile(self.state, target)
+        heuristic_function = Node.heuristic_function
+
+        if heuristic_function == "hamming":
+            goal_cells = goal.goal_cells
+            return (
+                self.h
+                + (empty_space != goal_cells[tile]) - (target != goal_cells[tile])
+                + (target != goal_cells[0]) - (empty_space != goal_cells[0])
+            )
+
+        distance = goal.distance_table[tile]
+        heuristic = self.h + distance[empty_space] - distance[target]
+        if heuristic_function == "manhattan":
+            return heuristic
+        if heuristic_function != "linear_conflict":
+            return None
+
+        # 横に動く場合は列が、縦に動く場合は行が変わる
+        # 衝突の数が変わるのは、タイルのゴールの列(行)と一致する移動元か移動先の列(行)だけ
+        size = self.size
+        goal_i, goal_j = self.goal_puzzle_dic[tile]
+        if target // size == empty_space // size:
+            is_row = False
+            goal_line = goal_j
+            lines = (target % size, empty_space % size)
+        else:
+            is_row = True
+            goal_line = goal_i
+            lines = (target // size, empty_space // size)
+        if goal_line in lines:
+            heuristic += 2 * (
+                self.count_line_conflicts(child_state, goal_line, is_row)
+                - self.count_line_conflicts(self.state, goal_line, is_row)
+            )
+        return heuristic
+
+    def pattern_database_heuristic(self):
+        """
+        パターンデータベースを使ったヒューリスティック関数
+        1. サイズとゴールごとのパターンデータベースを取得する(初回のみ読み込み・構築)
+        2. 各パターンのタイルの位置から最小手数を引き、その合計を返す
+        """
+        return PatternDatabase.load(self.goal).heuristic(
+            self.goal.get_tiles(self.state)
+        )
@@ -0,0 +1,216 @@
+import hashlib
+import mmap
+import os
+import sys
+import tempfile
+from collections import deque
+
+from Goal import Goal
+
+
+class PatternDatabase:
+    """
+    加算的(disjoint)パターンデータベース
+    タイルをいくつかのグループ(パターン)に分け、各パターンのタイルだけを
+    ゴールの位置に戻すのに必要な最小手数をあらかじめ計算しておく。
+    各パターンは自分のタイルの移動だけを数えるため、合計しても許容的(admissible)になる。
+    """
+
+    # サイズごとのパターン分割(タイル番号は螺旋状のゴールに対応する)
+    # 4x4は5-5-5、5x5は4タイルずつの6分割(純Pythonで現実的な時間で構築できる大きさ)
+    DEFAULT_PARTITIONS = {
+        3: ((1, 2, 3, 4), (5, 6, 7, 8)),
+        4: ((1, 2, 3, 12, 13), (4, 5, 6, 14, 15), (7, 8, 9, 10, 11)),
+        5: (
+            (1, 2, 3, 4),
+            (5, 6, 7, 8),
+            (9, 10, 11, 12),
+            (13, 14, 15, 16),
+            (17, 18, 19, 20),
+            (21, 22, 23, 24),
+        ),
+    }
+
+    # ディスク上のキャッシュディレクトリ
+    CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb")
+
+    # 読み込み済みのパターンデータベース(キー: (サイズ, ゴールのパズル))
+    _loaded = {}
+
+    def __init__(self, goal, partitions=None):
+        """
+        パターンデータベースの初期化(テーブルはまだ読み込まない)
+            goal = ゴール状態
+            partitions = タイルのグループのタプル
+            tables = パターンごとのテーブル(インデックス: タイル位置の組, 値: 最小手数)
+        """
+        if partitions is None:
+            if goal.size not in PatternDatabase.DEFAULT_PARTITIONS:
+                raise ValueError(
+                    f"pattern database is not available for size {goal.size}"
+                )
+            partitions = PatternDatabase.DEFAULT_PARTITIONS[goal.size]
+        self.goal = goal
+        self.size = goal.size
+        self.partitions = partitions
+        self.tables = None
+
+    @staticmethod
+    def load(goal):
+        """
+        サイズとゴールごとにキャッシュされたパターンデータベースを返す
+        初回だけディスクから読み込み(なければ構築して保存し)、以降は同じものを使い回す
+        """
+        key = (goal.size, goal.goal_puzzle)
+        pdb = PatternDatabase._loaded.get(key)
+        if pdb is None:
+            pdb = PatternDatabase(goal)
+            pdb.load_tables()
+            PatternDatabase._loaded[key] = pdb
+        return pdb
+
+    def get_file_path(self, index):
+        """
+        パターンごとのファイルパスを返す
+        ファイル名にはゴールと分割のハッシュを含め、異なるゴールのテーブルと混ざらないようにする
+        """
+        digest = hashlib.sha1(
+            repr((self.goal.goal_puzzle, self.partitions)).encode()
+        ).hexdigest()[:12]
+        return os.path.join(
+            PatternDatabase.CACHE_DIRECTORY, f"{self.size}_{digest}_{index}.pdb"
+        )
+
+    def load_tables(self):
+        """
+        各パターンのテーブルを読み込む
+        1. ファイルがなければ、逆向き幅優先探索で構築して保存する
+           (複数のプロセスが同時に構築しても混ざらないよう、プロセスごとの一時ファイルに書いてから置き換える。
+            構築している間に他のプロセスが保存し終えていれば、そちらを使う)
+        2. ファイルをメモリマップして、必要な部分だけを読み込む
+        """
+        os.makedirs(PatternDatabase.CACHE_DIRECTORY, exist_ok=True)
+        tables = []
+        for index, pattern in enumerate(self.partitions):
+            file_path = self.get_file_path(index)
+            if not os.path.isfile(file_path):
+                table = self.build_table(pattern)
+                if not os.path.isfile(file_path):
+                    self.save_table(file_path, table)
+            with open(file_path, "rb") as f:
+                tables.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        self.tables = tables
+
+    def save_table(self, file_path, table):
+        """
+        テーブルをプロセスごとの一時ファイルに書き、file_pathに置き換える(失敗したら一時ファイルを消す)
+        """
+        fd, temp_path = tempfile.mkstemp(
+            prefix=os.path.basename(file_path) + ".",
+            suffix=".tmp",
+            dir=PatternDatabase.CACHE_DIRECTORY,
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(table)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def build_table(self, pattern):
+        """
+        ゴールから逆向きに0-1幅優先探索を行い、パターンのテーブルを構築する
+        状態: パターンのタイルの位置の組 + 空白マスの位置
+        1. パターンのタイルを動かす手はコスト1、それ以外のタイルを動かす手はコスト0とする
+        2. 空白マスの位置ごとの最小値をとり、タイルの位置の組だけをインデックスとするテーブルにする
+        インデックス: 各タイルの位置(0 ~ n²-1)をn²進数の各桁とした数
+        """
+        size = self.size
+        cells = size * size
+        weights = [cells**i for i in range(len(pattern))]
+        table_size = cells ** len(pattern)
+
+        neighbors = []
+        for cell in range(cells):
+            i, j = divmod(cell, size)
+            neighbors.append(
+                tuple(
+                    (i + di) * size + (j + dj)
+                    for di, dj in ((0, 1), (0, -1), (1, 0), (-1, 0))
+                    if 0 <= i + di < size and 0 <= j + dj < size
+                )
+            )
+
+        goal_index = 0
+        for weight, tile in zip(weights, pattern):
+            goal_i, goal_j = self.goal.goal_puzzle_dic[tile]
+            goal_index += (goal_i * size + goal_j) * weight
+        goal_blank = self.goal.goal_empty_row * size + self.goal.goal_empty_col
+
+        # 状態ごとの最小手数(255は未到達)
+        distance = bytearray(b"\xff") * (table_size * cells)
+        table = bytearray(b"\xff") * table_size
+        start = goal_index * cells + goal_blank
+        distance[start] = 0
+        queue = deque([start])
+
+        while queue:
+            state = queue.popleft()
+            cost = distance[state]
+            index, blank = divmod(state, cells)
+            if cost < table[index]:
+                table[index] = cost
+
+            positions = []
+            rest = index
+            for _ in pattern:
+                rest, position = divmod(rest, cells)
+                positions.append(position)
+
+            for cell in neighbors[blank]:
+                if cell in positions:
+                    # パターンのタイルを空白マスに動かす(コスト1)
+                    tile_index = positions.index(cell)
+                    next_state = (
+                        index + (blank - cell) * weights[tile_index]
+                    ) * cells + cell
+                    if cost + 1 < distance[next_state]:
+                        distance[next_state] = cost + 1
+                        queue.append(next_state)
+                else:
+                    # パターン外のタイルを動かす(コスト0)
+                    next_state = index * cells + cell
+                    if cost < distance[next_state]:
+                        distance[next_state] = cost
+                        queue.appendleft(next_state)
+        return table
+
+    def heuristic(self, tiles):
+        """
+        各パターンのテーブルを引いて、その合計を推定コストとする
+        tiles: 左上から順に並べたマス目の数字のリスト(Goal.get_tilesを参照)
+        """
+        cells = self.size * self.size
+        positions = [0] * cells
+        for position, tile in enumerate(tiles):
+            positions[tile] = position
+
+        heuristic = 0
+        for table, pattern in zip(self.tables, self.partitions):
+            index = 0
+            weight = 1
+            for tile in pattern:
+                index += positions[tile] * weight
+                weight *= cells
+            heuristic += table[index]
+        return heuristic
+
+
+if __name__ == "__main__":
+    # 事前計算用: python PatternDatabase.py <サイズ>...
+    for arg in sys.argv[1:] or ["3", "4"]:
+        goal = Goal(int(arg))
+        PatternDatabase.load(goal)
+        print(f"pattern database for size {goal.size} is ready")
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import time
+
+from Node import Node
+
+
+class SolutionCache:
+    """
+    解いたパズルの手順を保存しておくディスク上のキャッシュ(SQLite)
+    キー: (サイズ, 探索アルゴリズム, ヒューリスティック関数, 正規化した盤面)
+    1. 対称な盤面(ゴールを変えない回転・鏡映とタイルの付け替えで移り合う盤面)は同じ盤面として扱う
+    2. 最適解を返すアルゴリズムの解は、途中の盤面からゴールまでの手順(部分経路)も保存する
+    3. 保存する盤面の数がmax_entriesを超えたら、最も長く使われていないものから削除する(LRU)
+    """
+
+    # ディスク上のキャッシュファイル
+    DEFAULT_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "cache", "solutions.sqlite3"
+    )
+    MAX_ENTRIES = 1_000_000
+
+    # 最適解を返すアルゴリズム(解の途中の盤面からの残りの手順も最適解になる)
+    OPTIMAL_ALGORITHMS = (
+        "astar",
+        "ucs",
+        "idastar",
+        "parallel_idastar",
+        "bidirectional",
+        "external",
+    )
+
+    # 盤面の回転・鏡映(中心を原点とした座標に掛ける行列)
+    TRANSFORMS = (
+        ((1, 0), (0, 1)),
+        ((0, 1), (1, 0)),
+        ((-1, 0), (0, 1)),
+        ((1, 0), (0, -1)),
+        ((-1, 0), (0, -1)),
+        ((0, -1), (-1, 0)),
+        ((0, 1), (-1, 0)),
+        ((0, -1), (1, 0)),
+    )
+
+    # 計算済みの対称性(キー: (サイズ, ゴールのパズル))
+    _symmetries = {}
+
+    def __init__(self, path=None, max_entries=None):
+        """
+        キャッシュの初期化(ファイルとテーブルがなければ作る)
+            path = キャッシュファイルのパス
+            max_entries = 保存する盤面の数の上限
+        """
+        self.path = path or SolutionCache.DEFAULT_PATH
+        self.max_entries = max_entries or SolutionCache.MAX_ENTRIES
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 複数のワーカープロセスから同時に書き込む場合に備えて、ロックを待つ
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        # 参照のたびに最終使用時刻を書き込むので、コミットごとのfsyncを避ける
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions ("
+            " size INTEGER, algorithm TEXT, heuristic TEXT, board BLOB,"
+            " moves TEXT, last_used REAL,"
+            " PRIMARY KEY (size, algorithm, heuristic, board))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)"
+        )
+        # 保存している盤面の数(putのたびにCOUNT(*)で全件を数えないよう、トリガーで増減させる)
+        # 数を持たない古いキャッシュファイルでは、作る時に一度だけ数える
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solution_count ("
+            " id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER)"
+        )
+        self.connection.execute(
+            "INSERT OR IGNORE INTO solution_count SELECT 0, COUNT(*) FROM solutions"
+            " WHERE NOT EXISTS (SELECT 1 FROM solution_count)"
+        )
+        self.connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS solutions_insert AFTER INSERT ON solutions"
+            " BEGIN UPDATE solution_count SET entries = entries + 1; END"
+        )
+        self.connection.execute(
+            "CREATE TRIGGER IF NOT EXISTS solutions_delete AFTER DELETE ON solutions"
+            " BEGIN UPDATE solution_count SET entries = entries - 1; END"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def get_symmetries(goal):
+        """
+        ゴールの盤面を変えない対称性のリストを返す
+        各対称性は (マスの移り先, タイルの付け替え, 手(U/D/L/R)の移り先)
+        1. 回転・鏡映のうち、ゴールの空白マスの位置を動かさないものだけを使う
+        2. タイルは、ゴールでの位置の移り先にあるゴールのタイルに付け替える
+        手順を移り先の手に置き換えると、対称な盤面の解になる(手数は変わらない)
+        """
+        key = (goal.size, goal.goal_puzzle)
+        symmetries = SolutionCache._symmetries.get(key)
+        if symmetries is not None:
+            return symmetries
+
+        size = goal.size
+        goal_tiles = [tile for row in goal.goal_puzzle for tile in row]
+        goal_blank = goal.goal_empty_row * size + goal.goal_empty_col
+        symmetries = []
+        for (a, b), (c, d) in SolutionCache.TRANSFORMS:
+            # 座標を2倍して中心を原点にすると、回転・鏡映が整数の計算で書ける
+            cell_map = []
+            for cell in range(size * size):
+                i, j = divmod(cell, size)
+                x, y = 2 * i - (size - 1), 2 * j - (size - 1)
+                new_i = (a * x + b * y + size - 1) // 2
+                new_j = (c * x + d * y + size - 1) // 2
+                cell_map.append(new_i * size + new_j)
+            if cell_map[goal_blank] != goal_blank:
+                continue
+            tile_map = [goal_tiles[cell_map[cell]] for cell in goal.goal_cells]
+            move_map = {}
+            for move, (di, dj) in Node.DIRECTIONS.items():
+                direction = (a * di + b * dj, c * di + d * dj)
+                for other, other_direction in Node.DIRECTIONS.items():
+                    if other_direction == direction:
+                        move_map[move] = other
+            symmetries.append((cell_map, tile_map, move_map))
+        SolutionCache._symmetries[key] = symmetries
+        return symmetries
+
+    @staticmethod
+    def canonicalize(goal, tiles):
+        """
+        盤面(左上から順に並べたタイルのリスト)を正規化する
+        対称な盤面のうち、バイト列として最小のものと、そこへ移す対称性を返す
+        """
+        best = None
+        for symmetry in SolutionCache.get_symmetries(goal):
+            cell_map, tile_map, _ = symmetry
+            board = bytearray(len(tiles))
+            for cell, tile in enumerate(tiles):
+                board[cell_map[cell]] = tile_map[tile]
+            board = bytes(board)
+            if best is None or board < best[0]:
+                best = (board, symmetry)
+        return best
+
+    def get(self, goal, algorithm, heuristic, puzzle):
+        """
+        パズル(行のタプル)の手順を返す(なければNone)
+        正規化した盤面の手順を、元の盤面の向きに戻して返す
+        """
+        board, (_, _, move_map) = self.canonicalize(
+            goal, [tile for row in puzzle for tile in row]
+        )
+        key = (goal.size, algorithm, heuristic, board)
+        row = self.connection.execute(
+            "SELECT moves FROM solutions"
+            " WHERE size = ? AND algorithm = ? AND heuristic = ? AND board = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute(
+            "UPDATE solutions SET last_used = ?"
+            " WHERE size = ? AND algorithm = ? AND heuristic = ? AND board = ?",
+            (time.time(),) + key,
+        )
+        self.connection.commit()
+        inverse_move_map = {value: move for move, value in move_map.items()}
+        return "".join(inverse_move_map[move] for move in row[0])
+
+    def put(self, goal, algorithm, heuristic, puzzle, moves):
+        """
+        パズル(行のタプル)の手順を保存する
+        1. 最適解を返すアルゴリズムの場合は、手順の途中の各盤面について、そこからの残りの手順も保存する
+        2. 既に保存されている手順の方が短い場合は、そちらを残す(最終使用時刻は常に更新する)
+        3. 上限を超えた分を、最も長く使われていない盤面から削除する
+           (盤面の数はトリガーで増減させているsolution_countから読む)
+        """
+        Node.set_goal(goal)
+        state = goal.pack_puzzle(puzzle)
+        tiles = goal.get_tiles(state)
+        empty_space = tiles.index(0)
+        now = time.time()
+
+        rows = []
+        for index in range(len(moves)):
+            board, (_, _, move_map) = self.canonicalize(goal, tiles)
+            rows.append(
+                (
+                    goal.size,
+                    algorithm,
+                    heuristic,
+                    board,
+                    "".join(move_map[move] for move in moves[index:]),
+                    now,
+                )
+            )
+            if algorithm not in SolutionCache.OPTIMAL_ALGORITHMS:
+                break
+            state, empty_space = Node.apply_move(state, empty_space, moves[index])
+            tiles = goal.get_tiles(state)
+        if not moves:
+            board, _ = self.canonicalize(goal, tiles)
+            rows.append((goal.size, algorithm, heuristic, board, "", now))
+
+        self.connection.executemany(
+            "INSERT INTO solutions VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (size, algorithm, heuristic, board) DO UPDATE"
+            " SET moves = CASE WHEN length(excluded.moves) < length(solutions.moves)"
+            " THEN excluded.moves ELSE solutions.moves END,"
+            " last_used = excluded.last_used",
+            rows,
+        )
+        (count,) = self.connection.execute(
+            "SELECT entries FROM solution_count"
+        ).fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM solutions WHERE rowid IN"
+                " (SELECT rowid FROM solutions ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.connection.commit()
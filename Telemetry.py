@@ -0,0 +1,174 @@
+import cProfile
+import json
+import time
+import tracemalloc
+
+from BatchExpander import BatchExpander
+from BucketQueue import BucketQueue
+from Node import Node
+
+
+class Telemetry:
+    """
+    探索中の計測値を一定間隔でJSON Linesに書き出す(計測する場合だけ使う)
+    with Telemetry(...): の中で実行した探索が対象になる。
+    1. 探索のループは Telemetry.active がNoneでない場合だけ update を呼ぶ(計測しない場合の負担はその判定だけ)
+    2. 計測中は、ヒューリスティック関数・子Nodeの生成・キューの操作を時間を測る関数に差し替える
+    3. 探索がprofile_after秒を超えたら、cProfileとtracemallocを開始し、終了時にファイルに書き出す
+    """
+
+    # 計測中のインスタンス(探索のループから参照する)
+    active = None
+
+    # 時間を測る関数(クラス, メソッド名, 時間の分類)
+    # 子Nodeの生成の時間には、その中で呼ぶヒューリスティック関数の時間を含めない
+    TIMED_METHODS = (
+        (Node, "get_child_heuristic", "heuristic"),
+        (Node, "pattern_database_heuristic", "heuristic"),
+        (BatchExpander, "get_heuristics", "heuristic"),
+        (Node, "get_children", "children"),
+        (BatchExpander, "expand", "children"),
+        (BucketQueue, "push", "queue"),
+        (BucketQueue, "pop", "queue"),
+        (BucketQueue, "peek_priority", "queue"),
+    )
+
+    # updateが呼ばれる回数に対して、時刻を確認する間隔
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, output_path, interval=1.0, profile_after=None):
+        """
+        計測の初期化
+            output_path = 計測値を書き出すJSON Linesファイル
+            interval = 計測値を書き出す間隔(秒)
+            profile_after = cProfileとtracemallocを開始するまでの時間(秒、Noneなら使わない)
+            seconds = 分類ごとの累計時間
+            total = 全分類の累計時間(入れ子の呼び出しの時間を差し引くために使う)
+        """
+        self.output_path = output_path
+        self.interval = interval
+        self.profile_after = profile_after
+        self.seconds = {"heuristic": 0.0, "children": 0.0, "queue": 0.0}
+        self.total = [0.0]
+        self.profiler = None
+        self.output = None
+        self.originals = []
+
+    def __enter__(self):
+        """
+        計測を開始する(関数を差し替え、Telemetry.activeに設定する)
+        """
+        self.output = open(self.output_path, "w")
+        self.start = self.last_time = time.perf_counter()
+        self.last_expanded = 0
+        self.calls = 0
+        self.record = None
+        for cls, name, category in Telemetry.TIMED_METHODS:
+            method = cls.__dict__[name]
+            self.originals.append((cls, name, method))
+            setattr(cls, name, self.wrap(method, category))
+        Telemetry.active = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        計測を終了する
+        1. 差し替えた関数を元に戻す
+        2. 最後の計測値を書き出す
+        3. プロファイルを取っていれば、cProfileの統計とtracemallocのスナップショットを書き出す
+        """
+        Telemetry.active = None
+        for cls, name, method in reversed(self.originals):
+            setattr(cls, name, method)
+        self.originals = []
+        if self.record is not None:
+            self.write("done", *self.record)
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.output_path + ".prof")
+            tracemalloc.take_snapshot().dump(self.output_path + ".tracemalloc")
+            tracemalloc.stop()
+            self.profiler = None
+        self.output.close()
+        return False
+
+    def wrap(self, method, category):
+        """
+        呼び出しにかかった時間を分類ごとに加算する関数を返す
+        中で呼んだ計測対象の関数の時間(子Nodeの生成の中のヒューリスティック関数など)は差し引く
+        """
+        seconds = self.seconds
+        total = self.total
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            total_before = total[0]
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start - (total[0] - total_before)
+                seconds[category] += elapsed
+                total[0] += elapsed
+
+        if isinstance(method, staticmethod):
+            return staticmethod(timed)
+        return timed
+
+    def update(self, expanded, frontier, closed, bound, stale_pops=0):
+        """
+        探索のループから呼ばれ、interval秒ごとに計測値を書き出す
+            expanded = 展開したNodeの数
+            frontier = 展開待ちの状態の数
+            closed = 閉じた状態(展開済み・経路上)の数
+            bound = 探索の現在の境界(A*系とIDA*はf値、一様コスト探索はg値、貪欲探索はh値、双方向探索は層の深さ)
+            stale_pops = キューから読み飛ばした無効な要素の数
+        """
+        self.record = (expanded, frontier, closed, bound, stale_pops)
+        self.calls += 1
+        if self.calls % Telemetry.CHECK_INTERVAL:
+            return
+        now = time.perf_counter()
+        if now - self.last_time < self.interval:
+            return
+        self.write("progress", *self.record)
+        if (
+            self.profile_after is not None
+            and self.profiler is None
+            and now - self.start > self.profile_after
+        ):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            tracemalloc.start()
+            self.output.write(
+                json.dumps(
+                    {"event": "profile_started", "seconds": round(now - self.start, 3)}
+                )
+                + "\n"
+            )
+
+    def write(self, event, expanded, frontier, closed, bound, stale_pops):
+        """
+        計測値を1行のJSONとして書き出す
+        nodes_per_second は前回書き出してからの展開速度
+        """
+        now = time.perf_counter()
+        elapsed = now - self.last_time
+        record = {
+            "event": event,
+            "seconds": round(now - self.start, 3),
+            "expanded": expanded,
+            "nodes_per_second": round((expanded - self.last_expanded) / elapsed, 1)
+            if elapsed > 0
+            else None,
+            "frontier": frontier,
+            "closed": closed,
+            "f_bound": bound,
+            "stale_pops": stale_pops,
+        }
+        for category, seconds in self.seconds.items():
+            record[f"{category}_seconds"] = round(seconds, 3)
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+        self.last_time = now
+        self.last_expanded = expanded
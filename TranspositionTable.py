@@ -0,0 +1,114 @@
+class TranspositionTable:
+    """
+    大きさが固定の置換表(状態 → それまでに見つかった最小のg値と、その経路で状態にした手)
+    閉じた状態の辞書(closed_dict)の代わりに使い、メモリの上限を超えて増えないようにする
+    手順は閉じた状態の辞書と同じく、手をたどって復元する(main.trace_tableを参照)
+    1. 状態のハッシュ値から表のスロットを決める(1つのスロットに2つの段がある)
+    2. 1段目は深さ優先: g値が小さい(スタートに近い)状態を残す
+       スタートに近い状態ほど、重複して展開した場合に探索し直す部分木が大きいため
+    3. 2段目は常に置き換える: 1段目に入らなかった状態と、1段目から押し出された状態を入れる
+    追い出された状態は重複として検出できなくなり、再び展開されることがある(探索は失敗しない)
+    """
+
+    # ハッシュ値を混ぜる乗数(黄金比の2^64倍に近い奇数、Fibonacci hashing)
+    MULTIPLIER = 0x9E3779B97F4A7C15
+    MASK = (1 << 64) - 1
+
+    def __init__(self, capacity):
+        """
+        置換表の初期化
+            capacity = 保持する状態の数の上限(2段に分けるので、スロットの数はその半分)
+            slots = スロットの数
+            states, costs, moves = 2つの段を交互に並べた、状態・g値・その状態にした手の表(空きはNone)
+            count = 保持している状態の数
+            evictions = 追い出した状態の数
+        """
+        slots = max(1, capacity // 2)
+        self.slots = slots
+        self.states = [None] * (slots * 2)
+        self.costs = [0] * (slots * 2)
+        self.moves = [None] * (slots * 2)
+        self.count = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, state):
+        return self.get(state) is not None
+
+    def get_index(self, state):
+        """
+        状態のスロットの1段目の位置を返す(2段目はその次)
+        ハッシュ値を混ぜた64ビットの値にスロットの数を掛けて上位の桁を取り、0 ~ slots-1 に対応させる
+        (スロットの数が2の累乗でなくても偏らないので、capacityをそのまま使える)
+        """
+        mixed = (hash(state) * TranspositionTable.MULTIPLIER) & TranspositionTable.MASK
+        return ((mixed * self.slots) >> 64) * 2
+
+    def get(self, state):
+        """
+        状態のg値を返す(表になければNone)
+        """
+        entry = self.get_entry(state)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, state):
+        """
+        状態の (g値, その状態にした手) を返す(表になければNone)
+        """
+        index = self.get_index(state)
+        states = self.states
+        if states[index] == state:
+            return self.costs[index], self.moves[index]
+        if states[index + 1] == state:
+            return self.costs[index + 1], self.moves[index + 1]
+        return None
+
+    def store(self, state, g, move=None):
+        """
+        状態のg値と、その状態にした手を記録する
+        1. 既に表にあれば、g値が小さくなった場合だけ書き換える(2段目の方が小さくなったら1段目と入れ替える)
+        2. 1段目が空か、1段目の状態よりg値が小さければ1段目に入れ、元の1段目の状態を2段目に移す
+        3. それ以外は2段目に入れる
+        手をたどると、g値が1ずつ小さい状態を通ってスタートに戻る(途中が追い出されていなければ)
+        """
+        index = self.get_index(state)
+        states = self.states
+        costs = self.costs
+        moves = self.moves
+        if states[index] == state:
+            if g < costs[index]:
+                costs[index], moves[index] = g, move
+            return
+        if states[index + 1] == state:
+            if g < costs[index + 1]:
+                costs[index + 1], moves[index + 1] = g, move
+            if costs[index + 1] < costs[index]:
+                states[index], states[index + 1] = states[index + 1], states[index]
+                costs[index], costs[index + 1] = costs[index + 1], costs[index]
+                moves[index], moves[index + 1] = moves[index + 1], moves[index]
+            return
+
+        # 2段目に入っていた状態は上書きされる(1段目が空なら2段目も空)
+        evicted = states[index + 1] is not None
+        if states[index] is None or g < costs[index]:
+            # 元の1段目の状態は2段目に押し出す
+            states[index + 1], costs[index + 1] = states[index], costs[index]
+            moves[index + 1] = moves[index]
+            states[index], costs[index], moves[index] = state, g, move
+        else:
+            states[index + 1], costs[index + 1], moves[index + 1] = state, g, move
+        if evicted:
+            self.evictions += 1
+        else:
+            self.count += 1
+
+    def clear(self):
+        """
+        全ての状態を削除する(IDA*の閾値を更新するたびに使う)
+        """
+        self.states = [None] * len(self.states)
+        self.moves = [None] * len(self.moves)
+        self.count = 0
+        self.evictions = 0
@@ -0,0 +1,236 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Goal import Goal
+from Node import Node
+from SolutionCache import SolutionCache
+from main import (
+    ALGORITHMS,
+    HEURISTICS,
+    check_solvable,
+    read_puzzle,
+    set_external_work_directory,
+)
+
+# ワーカープロセスごとに開いた解のキャッシュ(キー: キャッシュファイルのパス)
+_caches = {}
+# ワーカープロセスごとに作ったゴール(キー: サイズ)
+_goals = {}
+
+
+def find_puzzle_files(paths):
+    """
+    引数のファイル・ディレクトリ・globパターンから、パズルファイルの一覧を作る
+    1. ディレクトリの場合は、その下の.txtファイルを再帰的に集める
+    2. globパターンの場合は、一致するファイルを集める
+    3. 同じファイルは一度だけ含める
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in names:
+                    if name.endswith(".txt"):
+                        files.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            files.extend(
+                match for match in glob.glob(path, recursive=True) if os.path.isfile(match)
+            )
+    return sorted(set(files))
+
+
+def handle_timeout(signum, frame):
+    raise TimeoutError
+
+
+def init_worker(memory_limit, work_directory=None):
+    """
+    ワーカープロセスの初期化
+    memory_limit(MB)が指定されていれば、プロセスのアドレス空間の上限を設定する
+    work_directoryが指定されていれば、外部メモリ探索が層のファイルを書き出すディレクトリにする
+    """
+    if memory_limit:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit * 1024 * 1024, hard))
+    if work_directory:
+        set_external_work_directory(work_directory)
+    signal.signal(signal.SIGALRM, handle_timeout)
+
+
+def get_goal(size):
+    """
+    このプロセスで作ったサイズごとのゴールを返す(初回だけ作る)
+    """
+    goal = _goals.get(size)
+    if goal is None:
+        goal = Goal(size)
+        _goals[size] = goal
+    return goal
+
+
+def get_cache(cache_path):
+    """
+    このプロセスで開いた解のキャッシュを返す(初回だけ開く)
+    """
+    cache = _caches.get(cache_path)
+    if cache is None:
+        cache = SolutionCache(cache_path)
+        _caches[cache_path] = cache
+    return cache
+
+
+def solve_file(file_path, algorithm, heuristic, timeout, cache_path=None):
+    """
+    1つのパズルファイルを解き、結果を辞書で返す
+    """
+    try:
+        size, puzzle = read_puzzle(file_path)
+    except (OSError, ValueError) as e:
+        return {
+            "file": file_path,
+            "algorithm": algorithm,
+            "heuristic": heuristic,
+            "status": "error",
+            "error": str(e),
+        }
+    record = {"file": file_path}
+    record.update(
+        solve_puzzle(size, puzzle, algorithm, heuristic, timeout, cache_path)
+    )
+    return record
+
+
+def solve_puzzle(size, puzzle, algorithm, heuristic, timeout, cache_path=None):
+    """
+    1つのパズルを解き、結果を辞書で返す
+    status: solved / unsolvable / not_found / timeout / memory / error
+    cache_pathを指定した場合は、解のキャッシュにあればその手順を返し("cached": true)、
+    なければ解いた手順をキャッシュに保存する
+    """
+    record = {"algorithm": algorithm, "heuristic": heuristic, "size": size}
+    start = time.perf_counter()
+    try:
+        goal = get_goal(size)
+        if not check_solvable(puzzle, goal):
+            record["status"] = "unsolvable"
+        else:
+            Node.set_heuristic_function(heuristic)
+            cache = get_cache(cache_path) if cache_path else None
+            moves = None
+            if cache is not None:
+                moves = cache.get(goal, algorithm, heuristic, puzzle)
+            if moves is not None:
+                # キャッシュにあった場合は状態を1つも開いていない
+                result = (moves, 0, 0)
+                record["cached"] = True
+            else:
+                if timeout:
+                    signal.setitimer(signal.ITIMER_REAL, timeout)
+                try:
+                    result = ALGORITHMS[algorithm](puzzle, goal)
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+                if result is not None and cache is not None:
+                    cache.put(goal, algorithm, heuristic, puzzle, result[0])
+            if result is None:
+                record["status"] = "not_found"
+            else:
+                moves, total_opened_states, max_states_in_memory = result
+                record["status"] = "solved"
+                record["moves"] = len(moves)
+                record["solution"] = moves
+                record["complexity_in_time"] = total_opened_states
+                record["complexity_in_size"] = max_states_in_memory
+    except TimeoutError:
+        record["status"] = "timeout"
+    except MemoryError:
+        record["status"] = "memory"
+    except (OSError, ValueError, sqlite3.Error) as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solve N-Puzzle files in parallel and stream one JSON line per puzzle."
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="puzzle files, directories or glob patterns"
+    )
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="astar")
+    parser.add_argument("--heuristic", choices=HEURISTICS, default="manhattan")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=None, help="seconds allowed per puzzle"
+    )
+    parser.add_argument(
+        "-m", "--memory-limit", type=int, default=None,
+        help="memory cap per worker process in MB",
+    )
+    parser.add_argument(
+        "--work-directory", default=None,
+        help="directory External Memory Search writes its layer files to",
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="JSON lines output file ('-' for stdout)"
+    )
+    parser.add_argument(
+        "-c", "--cache", nargs="?", const=SolutionCache.DEFAULT_PATH, default=None,
+        help="reuse and store solutions in this SQLite file"
+        f" (default path: {SolutionCache.DEFAULT_PATH})",
+    )
+    args = parser.parse_args()
+
+    files = find_puzzle_files(args.paths)
+    if not files:
+        print("Error: No puzzle files were found.")
+        return
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=args.jobs,
+            initializer=init_worker,
+            initargs=(args.memory_limit, args.work_directory),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    solve_file,
+                    file_path,
+                    args.algorithm,
+                    args.heuristic,
+                    args.timeout,
+                    args.cache,
+                ): file_path
+                for file_path in files
+            }
+            # 終わった順に1行ずつ書き出す
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # ワーカープロセスが落ちた場合など
+                    record = {"file": futures[future], "status": "error", "error": repr(e)}
+                print(json.dumps(record), file=output, flush=True)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from Goal import Goal
+from batch import init_worker, solve_puzzle
+from generate import shuffle_board, walk_board
+from main import check_solvable, read_puzzle, set_anytime_time_budget
+
+# 難易度ごとのインスタンス集合
+# 数字: ゴールからのランダムウォークの手数, "shuffle": 一様にランダムな解けるパズル
+DIFFICULTIES = {
+    3: {"easy": 10, "medium": 20, "hard": "shuffle"},
+    4: {"easy": 15, "medium": 30, "hard": 60},
+    5: {"easy": 15, "medium": 30},
+    **{size: {"hard": "shuffle"} for size in range(6, 11)},
+}
+INSTANCES_PER_DIFFICULTY = 3
+
+# これより短い実行時間の差は計測誤差として扱う(秒)
+MINIMUM_SECONDS = 0.05
+
+# ARA*の制限時間(秒)。main.TIME_BUDGETのままでは、4x4以上の1ケースごとに制限時間いっぱいかかる
+ANYTIME_TIME_BUDGET = 1
+# 制限時間までに見つけた解を返すアルゴリズム(手数が計算機の速さや負荷で変わるので、ベースラインと手数を比べない)
+TIME_BUDGETED_ALGORITHMS = ("anytime_astar",)
+
+# main()で選べる組み合わせ(一様コスト探索と双方向探索と分割統治はヒューリスティック関数を使わない)
+COMBINATIONS = [
+    ("astar", "manhattan"),
+    ("astar", "hamming"),
+    ("astar", "linear_conflict"),
+    ("astar", "pattern_database"),
+    ("weighted_astar", "manhattan"),
+    ("weighted_astar", "linear_conflict"),
+    ("anytime_astar", "manhattan"),
+    ("greedy", "manhattan"),
+    ("greedy", "hamming"),
+    ("greedy", "linear_conflict"),
+    ("greedy", "pattern_database"),
+    ("greedy_batch", "manhattan"),
+    ("greedy_batch", "linear_conflict"),
+    ("ucs", "manhattan"),
+    ("idastar", "manhattan"),
+    ("idastar", "linear_conflict"),
+    ("idastar", "pattern_database"),
+    ("parallel_idastar", "linear_conflict"),
+    ("bidirectional", "manhattan"),
+    ("external", "linear_conflict"),
+    ("decomposition", "manhattan"),
+]
+
+# 6x6以上の盤面で使う、最適とは限らない解を短時間で返すアルゴリズム(分割統治と手数を比べる)
+LARGE_BOARD_ALGORITHMS = ("greedy", "greedy_batch", "weighted_astar", "decomposition")
+# 4x4以下の盤面だけで使うアルゴリズム(ディスクへの書き出しが多く、5x5では制限時間内に終わらない)
+SMALL_BOARD_ALGORITHMS = ("external",)
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzles")
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+
+
+def build_instances(sizes):
+    """
+    ベンチマークのインスタンス集合を作る
+    1. サイズと難易度ごとに、固定のseedから INSTANCES_PER_DIFFICULTY 個のパズルを生成する
+    2. puzzles/ 以下の解けるパズルを "fixture" として加える
+    """
+    instances = []
+    for size in sizes:
+        goal = Goal(size)
+        for difficulty, moves in DIFFICULTIES.get(size, {}).items():
+            for index in range(INSTANCES_PER_DIFFICULTY):
+                seed = f"{size}-{difficulty}-{index}"
+                if moves == "shuffle":
+                    tiles = shuffle_board(goal, random.Random(seed))
+                else:
+                    tiles = walk_board(goal, moves, random.Random(seed))
+                puzzle = tuple(
+                    tuple(tiles[i * size : (i + 1) * size]) for i in range(size)
+                )
+                instances.append((f"{size}/{difficulty}/{index}", size, puzzle))
+
+        fixture_directory = os.path.join(FIXTURE_DIRECTORY, str(size))
+        for root, _, names in sorted(os.walk(fixture_directory)):
+            if os.path.basename(root) == "unsolvable":
+                continue
+            for name in sorted(names):
+                if name.endswith(".txt"):
+                    fixture_size, puzzle = read_puzzle(os.path.join(root, name))
+                    if fixture_size == size and check_solvable(puzzle, goal):
+                        instance_id = os.path.relpath(
+                            os.path.join(root, name), FIXTURE_DIRECTORY
+                        )
+                        instances.append((f"fixture/{instance_id}", size, puzzle))
+    return instances
+
+
+def init_benchmark_worker(memory_limit):
+    """
+    ベンチマークのワーカープロセスの初期化
+    batch.init_workerの設定に加えて、ARA*の制限時間をANYTIME_TIME_BUDGETにする
+    """
+    init_worker(memory_limit)
+    set_anytime_time_budget(ANYTIME_TIME_BUDGET)
+
+
+def run_case(instance_id, size, puzzle, algorithm, heuristic, timeout):
+    """
+    1つのインスタンスを1つの組み合わせで解き、計測結果を返す
+    ワーカープロセスは1ケースごとに作り直すので、最大常駐メモリがそのケースのピークメモリになる
+    """
+    record = {"instance": instance_id}
+    record.update(solve_puzzle(size, puzzle, algorithm, heuristic, timeout))
+    if record.get("complexity_in_time") and record["seconds"] > 0:
+        record["nodes_per_second"] = round(
+            record["complexity_in_time"] / record["seconds"], 1
+        )
+    record["peak_memory_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return record
+
+
+def get_case_key(record):
+    return f"{record['instance']}|{record['algorithm']}|{record['heuristic']}"
+
+
+def compare_with_baseline(records, baseline, tolerance):
+    """
+    ベースラインと比較して、悪化したケースの説明のリストを返す
+    1. 解けていたケースが解けなくなった
+    2. 手数が増えた(TIME_BUDGETED_ALGORITHMSは除く)
+    3. 実行時間・ピークメモリが許容範囲(tolerance)を超えて増えた
+    """
+    regressions = []
+    for record in records:
+        key = get_case_key(record)
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base["status"] == "solved" and record["status"] != "solved":
+            regressions.append(f"{key}: {record['status']} (baseline: solved)")
+            continue
+        if record["status"] != "solved":
+            continue
+        if (
+            record["algorithm"] not in TIME_BUDGETED_ALGORITHMS
+            and record["moves"] > base["moves"]
+        ):
+            regressions.append(f"{key}: moves {record['moves']} (baseline: {base['moves']})")
+        if (
+            record["seconds"] > base["seconds"] * (1 + tolerance)
+            and record["seconds"] - base["seconds"] > MINIMUM_SECONDS
+        ):
+            regressions.append(
+                f"{key}: seconds {record['seconds']} (baseline: {base['seconds']})"
+            )
+        if record["peak_memory_kb"] > base["peak_memory_kb"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: peak_memory_kb {record['peak_memory_kb']}"
+                f" (baseline: {base['peak_memory_kb']})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every algorithm/heuristic combination on seeded instance sets."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 4])
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=30, help="seconds allowed per case"
+    )
+    parser.add_argument(
+        "-m", "--memory-limit", type=int, default=2048,
+        help="memory cap per case in MB",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="number of cases run at the same time (1 keeps timings comparable)",
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="write the measured records to this JSON file"
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="store this run as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed relative increase of time and memory before a regression is flagged",
+    )
+    args = parser.parse_args()
+
+    instances = build_instances(args.sizes)
+    # main()と同じく、4x4以上ではA*と一様コスト探索を使わない
+    # 6x6以上では最適解を求めるアルゴリズムは終わらないので、LARGE_BOARD_ALGORITHMSだけを使う
+    # 5x5以上では外部メモリ探索(SMALL_BOARD_ALGORITHMS)を使わない
+    cases = [
+        (instance_id, size, puzzle, algorithm, heuristic)
+        for instance_id, size, puzzle in instances
+        for algorithm, heuristic in COMBINATIONS
+        if (size < 4 or algorithm not in ("astar", "ucs"))
+        and (size < 6 or algorithm in LARGE_BOARD_ALGORITHMS)
+        and (size <= 4 or algorithm not in SMALL_BOARD_ALGORITHMS)
+    ]
+
+    records = []
+    with ProcessPoolExecutor(
+        max_workers=args.jobs,
+        initializer=init_benchmark_worker,
+        initargs=(args.memory_limit,),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = [executor.submit(run_case, *case, args.timeout) for case in cases]
+        for future in futures:
+            record = future.result()
+            records.append(record)
+            print(
+                f"{get_case_key(record)}: {record['status']}"
+                + (
+                    f" moves={record['moves']} time={record['seconds']}s"
+                    f" nodes/s={record.get('nodes_per_second')}"
+                    f" peak={record['peak_memory_kb']}KB"
+                    if record["status"] == "solved"
+                    else ""
+                )
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({get_case_key(record): record for record in records}, f, indent=1)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(records, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
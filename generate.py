@@ -0,0 +1,190 @@
+import argparse
+import json
+import random
+import sys
+
+from Goal import Goal
+from Node import Node
+
+# 指定したヒューリスティック値の範囲に入るまでランダムウォークを続ける手数の上限(盤面1つあたり)
+BAND_WALK_LIMIT = 100_000
+
+# 書き出す前にためておく盤面の数
+WRITE_CHUNK = 4096
+
+
+def shuffle_board(goal, rng):
+    """
+    一様にランダムな解ける盤面(左上から順に並べたタイルのリスト)を返す
+    解けない盤面になった場合は、空白マス以外の最初の2枚を入れ替える
+    (置換の偶奇が変わり、解けない盤面と解ける盤面が1対1に対応するので、一様なまま捨てずに済む)
+    """
+    tiles = list(range(goal.size * goal.size))
+    rng.shuffle(tiles)
+    if not goal.is_solvable(tiles):
+        # 先頭の3マスのうち、少なくとも2マスは空白マスではない
+        first, second = [cell for cell in range(3) if tiles[cell] != 0][:2]
+        tiles[first], tiles[second] = tiles[second], tiles[first]
+    return tiles
+
+
+def get_walk_table(size):
+    """
+    空白マスの位置と直前の手ごとに、ランダムウォークで選べる(手, 動かした後の空白マスの位置)のリストを返す
+    直前の手を戻す手は選ばない(直前の手がNoneの場合は全ての手を選べる)
+    """
+    walk_table = []
+    for moves in Node.get_move_table(size):
+        candidates = {None: list(moves)}
+        for previous in Node.DIRECTIONS:
+            candidates[previous] = [
+                (move, target)
+                for move, target in moves
+                if move != Node.INVERSE_MOVES[previous]
+            ]
+        walk_table.append(candidates)
+    return walk_table
+
+
+def walk_board(goal, length, rng, walk_table=None):
+    """
+    ゴールから空白マスをlength回ランダムに動かした盤面(左上から順に並べたタイルのリスト)を返す
+    直前の手を戻す手は選ばないので、ゴールからの最短手数はおおよそlengthに比例する(length以下になる)
+    """
+    walk_table = walk_table or get_walk_table(goal.size)
+    tiles = [tile for row in goal.goal_puzzle for tile in row]
+    blank = goal.goal_empty_row * goal.size + goal.goal_empty_col
+    previous = None
+    for _ in range(length):
+        previous, target = rng.choice(walk_table[blank][previous])
+        tiles[blank], tiles[target] = tiles[target], 0
+        blank = target
+    return tiles
+
+
+def band_board(goal, low, high, rng, walk_table=None):
+    """
+    ゴールからランダムウォークを行い、マンハッタン距離の合計がlow以上high以下になった盤面を返す
+    マンハッタン距離は動かしたタイルの分だけ差分で更新する
+    BAND_WALK_LIMIT手以内に範囲に入らなければValueErrorを送出する
+    """
+    walk_table = walk_table or get_walk_table(goal.size)
+    distance_table = goal.distance_table
+    tiles = [tile for row in goal.goal_puzzle for tile in row]
+    blank = goal.goal_empty_row * goal.size + goal.goal_empty_col
+    previous = None
+    h = 0
+    for _ in range(BAND_WALK_LIMIT):
+        if low <= h <= high:
+            return tiles
+        previous, target = rng.choice(walk_table[blank][previous])
+        tile = tiles[target]
+        h += distance_table[tile][blank] - distance_table[tile][target]
+        tiles[blank], tiles[target] = tile, 0
+        blank = target
+    if low <= h <= high:
+        return tiles
+    raise ValueError(
+        f"no board with a Manhattan distance in [{low}, {high}]"
+        f" within {BAND_WALK_LIMIT} random moves"
+    )
+
+
+def generate_boards(size, count=None, seed=None, walk_length=None, band=None):
+    """
+    解ける盤面(左上から順に並べたタイルのリスト)をcount個(Noneなら限りなく)順に返すジェネレータ
+        seed = 乱数のseed(同じseedと引数からは常に同じ盤面の列が生成される)
+        walk_length = ゴールからのランダムウォークの手数(難易度の目安)
+        band = (low, high): マンハッタン距離の合計がこの範囲に入る盤面
+    walk_lengthもbandも指定しなければ、解ける盤面から一様にランダムに選ぶ
+    """
+    if walk_length is not None and band is not None:
+        raise ValueError("walk_length and band cannot be used together")
+    goal = Goal(size)
+    rng = random.Random(seed)
+    walk_table = get_walk_table(size)
+    index = 0
+    while count is None or index < count:
+        if walk_length is not None:
+            yield walk_board(goal, walk_length, rng, walk_table)
+        elif band is not None:
+            yield band_board(goal, band[0], band[1], rng, walk_table)
+        else:
+            yield shuffle_board(goal, rng)
+        index += 1
+
+
+def format_board(index, size, tiles, output_format):
+    """
+    盤面を1行にする
+        jsonl: service.pyのリクエストと同じ形式({"id": 番号, "size": サイズ, "board": タイルのリスト})
+        text: タイルを空白区切りで並べた行
+    """
+    if output_format == "jsonl":
+        return json.dumps({"id": index, "size": size, "board": tiles}) + "\n"
+    return " ".join(map(str, tiles)) + "\n"
+
+
+def write_boards(boards, size, output, output_format):
+    """
+    盤面をWRITE_CHUNK個ずつまとめてoutputに書き出し、書き出した数を返す
+    """
+    chunk = []
+    written = 0
+    for index, tiles in enumerate(boards):
+        chunk.append(format_board(index, size, tiles, output_format))
+        if len(chunk) >= WRITE_CHUNK:
+            output.writelines(chunk)
+            written += len(chunk)
+            chunk = []
+    output.writelines(chunk)
+    return written + len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream seeded, guaranteed-solvable boards to a file or stdout."
+    )
+    parser.add_argument("-s", "--size", type=int, default=3, help="board size")
+    parser.add_argument(
+        "-n", "--count", type=int, default=1, help="number of boards to generate"
+    )
+    parser.add_argument("--seed", default=None, help="random seed for reproducible output")
+    difficulty = parser.add_mutually_exclusive_group()
+    difficulty.add_argument(
+        "--walk", type=int, default=None, metavar="MOVES",
+        help="scramble the goal with a random walk of this many moves",
+    )
+    difficulty.add_argument(
+        "--band", type=int, nargs=2, default=None, metavar=("LOW", "HIGH"),
+        help="keep walking from the goal until the Manhattan distance is in [LOW, HIGH]",
+    )
+    parser.add_argument(
+        "-f", "--format", choices=["jsonl", "text"], default="jsonl",
+        help="JSON lines in the solver service request format, or one board per line",
+    )
+    parser.add_argument(
+        "-o", "--output", default=None, help="file the boards are written to (default: stdout)"
+    )
+    args = parser.parse_args()
+
+    if args.size < 2:
+        parser.error("size must be at least 2")
+    if args.band is not None and args.band[0] > args.band[1]:
+        parser.error("LOW must not be greater than HIGH")
+
+    boards = generate_boards(args.size, args.count, args.seed, args.walk, args.band)
+    try:
+        if args.output is None:
+            write_boards(boards, args.size, sys.stdout, args.format)
+        else:
+            with open(args.output, "w") as f:
+                written = write_boards(boards, args.size, f, args.format)
+            print(f"{written} boards written to {args.output}", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
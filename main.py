@@ -1,63 +1,251 @@
 import argparse
+import json
+import multiprocessing
 import random
 import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from fractions import Fraction
 from Node import Node
 from Goal import Goal
-import heapq
+from BucketQueue import BucketQueue
+from BatchExpander import BatchExpander
+from PatternDatabase import PatternDatabase
+from Telemetry import Telemetry
+from ExternalMemory import LayerWriter, decode_state, encode_state, get_record_size
+from DecompositionSolver import DecompositionSolver
+from TranspositionTable import TranspositionTable
+from generate import shuffle_board
 
 
-def print_result(current_node, total_opened_states, max_states_in_memory):
+# batched_greedy_searchで一度に展開するNodeの数
+BATCH_SIZE = 64
+
+# 重み付きA*探索の重みと、ARA*の最初の重み・重みを下げる幅・制限時間(秒)
+# 重みは分母がWEIGHT_DENOMINATOR以下の分数に丸める
+WEIGHT = 2
+ANYTIME_WEIGHT = 3
+WEIGHT_STEP = 0.5
+TIME_BUDGET = 10
+WEIGHT_DENOMINATOR = 100
+
+# 外部メモリ探索でメモリ上にためる状態の上限(MB)と、1つの状態がメモリ上で使うバイト数の見積もり
+EXTERNAL_MEMORY_LIMIT = 256
+EXTERNAL_BYTES_PER_STATE = 128
+# 外部メモリ探索が層のファイルを書き出すディレクトリの既定値
+# (/tmpはメモリ上のtmpfsのことがあるので、ディスク上のこのファイルの隣に置く)
+EXTERNAL_WORK_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "work")
+
+# 置換表(閉じた状態の辞書の代わり)に使うメモリの既定値(MB)と、1つの状態が置換表で使うバイト数の見積もり
+TRANSPOSITION_TABLE_LIMIT = 64
+TRANSPOSITION_BYTES_PER_STATE = 72
+# 置換表を使う貪欲探索の優先度 h*GREEDY_TABLE_WEIGHT + g の、h値の重み
+GREEDY_TABLE_WEIGHT = 100
+# 置換表を使う探索で、手順をたどる区切りのNodeを残すg値の間隔(trace_tableを参照)
+TRACE_INTERVAL = 16
+
+# 並列IDA*で、ワーカー1つあたりに作る部分木の数の目安と、打ち切りを確認する展開数の間隔
+PARALLEL_SPLIT_FACTOR = 16
+STOP_CHECK_INTERVAL = 4096
+
+
+def print_result(
+    puzzle,
+    goal,
+    moves,
+    total_opened_states,
+    max_states_in_memory,
+    output_path="result",
+    output_format="boards",
+    bound=None,
+):
     """
     結果を表示する
     1. 時間計算量
     2. 空間計算量
     3. 移動回数
-    4. 解のシーケンス
+    4. 準最適性の上限(boundを渡した場合のみ。解の手数は最適解の手数のbound倍以下)
+    5. 解のシーケンス
+    output_format:
+        boards = 解のシーケンスを盤面で書き出す(盤面は1手ずつ作り直しながら書き出す)
+        moves = 解のシーケンスを空白マスを動かす方向(U/D/L/R)の文字列で書き出す
+        json = 上記の情報と手順の文字列をJSONで書き出す
     """
-    with open("result", "w") as f:
+    with open(output_path, "w") as f:
+        if output_format == "json":
+            result = {
+                "complexity_in_time": total_opened_states,
+                "complexity_in_size": max_states_in_memory,
+                "number_of_moves": len(moves),
+                "moves": moves,
+            }
+            if bound is not None:
+                result["suboptimality_bound"] = float(bound)
+            json.dump(result, f)
+            print("", file=f)
+            return
         print(f"complexity in time: {total_opened_states}", file=f)
         print(f"complexity in size: {max_states_in_memory}", file=f)
-        print(f"number of moves: {current_node.g}", file=f)
-        solution_path = []
-        while current_node:
-            solution_path.append(current_node.puzzle)
-            current_node = current_node.parent
-        solution_path.reverse()
-        for state in solution_path:
-            for row in state:
+        print(f"number of moves: {len(moves)}", file=f)
+        if bound is not None:
+            print(f"suboptimality bound: {float(bound):.3f}", file=f)
+        if output_format == "moves":
+            print(moves, file=f)
+            return
+        for state in iterate_states(puzzle, goal, moves):
+            for row in goal.unpack_state(state):
                 print(row, file=f)
             print("", file=f)
 
 
-def generate_random_puzzle(n=3):
-    numbers = list(range(n * n))
-    random.shuffle(numbers)
+def iterate_states(puzzle, goal, moves):
+    """
+    スタートのパズルから、解の手順に従って1手ずつ動かした状態を順に返す
+    """
+    Node.set_goal(goal)
+    state = goal.pack_puzzle(puzzle)
+    empty_space = goal.get_tiles(state).index(0)
+    yield state
+    for move in moves:
+        state, empty_space = Node.apply_move(state, empty_space, move)
+        yield state
+
+
+def get_path_moves(node):
+    """
+    親Nodeをたどって、スタートからnodeまでの手順の文字列を作る
+    """
+    moves = []
+    while node.move is not None:
+        moves.append(node.move)
+        node = node.parent
+    moves.reverse()
+    return "".join(moves)
+
+
+def trace_moves(node, closed_dict):
+    """
+    閉じた状態の辞書(キー: 状態, 値: その状態にした手)を、nodeから逆向きにたどって手順の文字列を作る
+    """
+    moves = []
+    state, empty_space, move = node.state, node.empty_space, node.move
+    while move is not None:
+        moves.append(move)
+        state, empty_space = Node.apply_move(
+            state, empty_space, Node.INVERSE_MOVES[move]
+        )
+        move = closed_dict[state]
+    moves.reverse()
+    return "".join(moves)
+
+
+def trace_table(node, table, goal):
+    """
+    置換表(trace_movesの閉じた状態の辞書と同じく、状態ごとにその状態にした手を持つ)を、
+    nodeから逆向きにたどって手順の文字列を作る
+    置換表を使う探索では、Nodeは親Nodeの代わりに、g値がTRACE_INTERVALの倍数の一番近い祖先(区切りのNode)を持つ
+    1. nodeから区切りのNodeまでを、置換表の手で逆向きにたどる
+    2. 途中の状態が置換表から追い出されていたり、別の経路で記録し直されていたりして、
+       g値の差の手数以内で区切りのNodeに着かなければ、区切りのNodeからnodeまでをA*探索で探索し直す
+       (手数はTRACE_INTERVAL以下なので、閉じた状態の辞書を使ってもすぐに終わる)
+    3. パターンデータベースはゴールごとに構築が必要なので、探索し直す間はマンハッタン距離を使う
+       (計測中の場合も、探索し直す間は止めて、元の探索の計測値を上書きしないようにする)
+    4. 区切りのNodeから、その前の区切りのNodeまでを同じように繰り返す
+    戻り値: (手順の文字列, 探索し直しで展開したNodeの数)
+    """
+    segments = []
+    total_opened_states = 0
+    while node.parent is not None:
+        checkpoint = node.parent
+        moves = []
+        state, empty_space, move = node.state, node.empty_space, node.move
+        for _ in range(node.g - checkpoint.g):
+            moves.append(move)
+            state, empty_space = Node.apply_move(
+                state, empty_space, Node.INVERSE_MOVES[move]
+            )
+            if state == checkpoint.state:
+                break
+            entry = table.get_entry(state)
+            if entry is None or entry[1] is None:
+                break
+            move = entry[1]
+
+        if state == checkpoint.state:
+            moves.reverse()
+            segments.append("".join(moves))
+        else:
+            heuristic_function = Node.heuristic_function
+            if heuristic_function == "pattern_database":
+                Node.set_heuristic_function("manhattan")
+            telemetry = Telemetry.active
+            Telemetry.active = None
+            try:
+                moves, opened_states, _ = a_star_search(
+                    goal.unpack_state(checkpoint.state),
+                    Goal(goal.size, goal.unpack_state(node.state)),
+                )
+            finally:
+                Telemetry.active = telemetry
+                Node.set_heuristic_function(heuristic_function)
+                Node.set_goal(goal)
+            segments.append(moves)
+            total_opened_states += opened_states
+        node = checkpoint
+    segments.reverse()
+    return "".join(segments), total_opened_states
+
+
+def set_checkpoint(node):
+    """
+    置換表を使う探索で、nodeの親Nodeを区切りのNode(trace_tableを参照)に置き換える
+    親Nodeのg値がTRACE_INTERVALの倍数ならそのまま、そうでなければ親Nodeの区切りのNodeにする
+    (展開済みのNodeは区切りのNodeしか残らないので、保持するNodeは置換表と展開待ちのNodeの他は
+     展開したNodeの数のおよそ1/TRACE_INTERVALになる)
+    """
+    parent = node.parent
+    if parent.g % TRACE_INTERVAL:
+        node.parent = parent.parent
+
+
+def make_transposition_table(table_memory):
+    """
+    table_memory(MB)分の置換表を作る(Noneなら置換表を使わず、Noneを返す)
+    """
+    if table_memory is None:
+        return None
+    return TranspositionTable(
+        max(1, table_memory * 1024 * 1024 // TRANSPOSITION_BYTES_PER_STATE)
+    )
+
+
+def generate_random_puzzle(n=3, seed=None):
+    """
+    ランダムな解けるパズルを生成する(generate.shuffle_boardを参照)
+    seedを指定すると、同じseedからは常に同じパズルが生成される
+    """
+    numbers = shuffle_board(Goal(n), random if seed is None else random.Random(seed))
     puzzle = []
     for i in range(n):
         puzzle.append(numbers[i * n : (i + 1) * n])
     return puzzle
 
 
-def generate_random_puzzle_file():
+def generate_random_puzzle_file(size=3):
+    """
+    ランダムな解けるパズルを puzzles/temp_puzzle_*.txt に書き出し、そのパスを返す
+    ファイル名はmkstempで重ならないように決める(ディレクトリの中身を調べない)
+    """
     directory = "puzzles"
     os.makedirs(directory, exist_ok=True)
+    fd, full_path = tempfile.mkstemp(prefix="temp_puzzle_", suffix=".txt", dir=directory)
 
-    max_num = 0
-    for file in os.listdir(directory):
-        if file.startswith("temp_puzzle_") and file.endswith(".txt"):
-            num_part = file[len("temp_puzzle_") : -len(".txt")]
-            if num_part.isdigit():
-                num = int(num_part)
-                if num > max_num:
-                    max_num = num
-
-    new_filename = f"temp_puzzle_{max_num + 1}.txt"
-    full_path = os.path.join(directory, new_filename)
-
-    puzzle = generate_random_puzzle()
-    with open(full_path, "w") as f:
-        f.write(f"3\n")
+    puzzle = generate_random_puzzle(size)
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{size}\n")
         for row in puzzle:
             f.write(" ".join(map(str, row)) + "\n")
     return full_path
@@ -82,151 +270,868 @@ def read_puzzle(file_path):
 
 
 def uniform_cost_search(puzzle, goal):
-    Node.set_comparison_criteria("g")
-    start_node = Node(puzzle, 0, None, goal)
-    open_list = []
-    heapq.heappush(open_list, (start_node.g, start_node))
-    open_dict = {start_node.puzzle: start_node.g}
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    open_list = BucketQueue()
+    open_list.push(start_node.state, start_node, start_node.g)
     closed_dict = {}
     total_opened_states = 0
     max_states_in_memory = 0
+    telemetry = Telemetry.active
 
     while open_list:
-        _, current_node = heapq.heappop(open_list)
+        current_node = open_list.pop()
         total_opened_states += 1
 
-        if current_node.puzzle == goal.goal_puzzle:
-            print_result(current_node, total_opened_states, max_states_in_memory)
-            return
+        if current_node.state == goal.goal_state:
+            return (
+                trace_moves(current_node, closed_dict),
+                total_opened_states,
+                max_states_in_memory,
+            )
 
-        open_dict.pop(current_node.puzzle, None)
-        closed_dict[current_node.puzzle] = current_node
+        # 閉じた状態には最後の手だけを残し、親Nodeへの参照を切る
+        # (解の手順はtrace_movesで復元できるので、展開済みのNodeを残さなくてよい)
+        closed_dict[current_node.state] = current_node.move
+        current_node.parent = None
 
         for child in current_node.get_children():
-            if child.puzzle in closed_dict:
+            if child.state in closed_dict:
                 continue
-            if child.puzzle in open_dict:
-                if open_dict[child.puzzle] > child.g:
-                    open_dict[child.puzzle] = child.g
-                    heapq.heappush(open_list, (child.g, child))
-            else:
-                open_dict[child.puzzle] = child.g
-                heapq.heappush(open_list, (child.g, child))
+            open_node = open_list.get(child.state)
+            if open_node is None or open_node.g > child.g:
+                open_list.push(child.state, child, child.g)
 
         max_states_in_memory = max(
-            max_states_in_memory, len(open_dict) + len(closed_dict)
+            max_states_in_memory, len(open_list) + len(closed_dict)
         )
+        if telemetry is not None:
+            telemetry.update(
+                total_opened_states,
+                len(open_list),
+                len(closed_dict),
+                current_node.g,
+                open_list.stale_pops,
+            )
 
+    return None
 
-def greedy_best_first_search(puzzle, goal):
-    Node.set_comparison_criteria("h")
-    start_node = Node(puzzle, 0, None, goal)
-    open_list = []
-    heapq.heappush(open_list, (start_node.h, start_node))
-    open_dict = {start_node.puzzle: start_node.h}
+
+def greedy_best_first_search(puzzle, goal, batch_size=1, table_memory=None):
+    """
+    貪欲最良優先探索
+    batch_size > 1 の場合は、h値が小さい方から最大batch_size個のNodeをまとめて取り出し、
+    その子Nodeをまとめて生成する(BatchExpanderを参照。NumPyがなければ1つずつ展開する)
+    table_memory(MB)を指定した場合は、閉じた状態の辞書の代わりに大きさが固定の置換表を使う
+    (置換表から追い出された状態は再び展開されることがある。手順はtrace_tableで復元する)
+    h値だけの優先度では、追い出された状態を経路を伸ばしながら繰り返し展開して終わらないことがあるので、
+    置換表を使う場合は優先度を h*GREEDY_TABLE_WEIGHT + g にする(重みの大きい重み付きA*探索と同じく必ず終わる)
+    """
+    Node.set_goal(goal)
+    table = make_transposition_table(table_memory)
     closed_dict = {}
+    closed = closed_dict if table is None else table
+    h_weight, g_weight = (1, 0) if table is None else (GREEDY_TABLE_WEIGHT, 1)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    open_list = BucketQueue()
+    open_list.push(start_node.state, start_node, start_node.h * h_weight)
     total_opened_states = 0
     max_states_in_memory = 0
+    telemetry = Telemetry.active
+    expander = BatchExpander(goal) if batch_size > 1 else None
 
     while open_list:
-        _, current_node = heapq.heappop(open_list)
-        total_opened_states += 1
+        current_nodes = []
+        while open_list and len(current_nodes) < batch_size:
+            current_node = open_list.pop()
+            total_opened_states += 1
 
-        if current_node.puzzle == goal.goal_puzzle:
-            print_result(current_node, total_opened_states, max_states_in_memory)
-            return
+            if current_node.state == goal.goal_state:
+                if table is None:
+                    return (
+                        trace_moves(current_node, closed_dict),
+                        total_opened_states,
+                        max_states_in_memory,
+                    )
+                moves, retraced_states = trace_table(current_node, table, goal)
+                return (
+                    moves,
+                    total_opened_states + retraced_states,
+                    max_states_in_memory,
+                )
 
-        open_dict.pop(current_node.puzzle, None)
-        closed_dict[current_node.puzzle] = current_node
+            if table is None:
+                # 閉じた状態には最後の手だけを残し、親Nodeへの参照を切る
+                # (解の手順はtrace_movesで復元できるので、展開済みのNodeを残さなくてよい)
+                closed_dict[current_node.state] = current_node.move
+                current_node.parent = None
+            else:
+                table.store(current_node.state, current_node.g, current_node.move)
+            current_nodes.append(current_node)
 
-        for child in current_node.get_children():
-            if child.puzzle in closed_dict:
+        if expander is None:
+            children = current_node.get_children()
+        else:
+            children = expander.expand(current_nodes)
+
+        for child in children:
+            if child.state in closed:
                 continue
-            if child.puzzle in open_dict:
-                if open_dict[child.puzzle] > child.h:
-                    open_dict[child.puzzle] = child.h
-                    heapq.heappush(open_list, (child.h, child))
-            else:
-                open_dict[child.puzzle] = child.h
-                heapq.heappush(open_list, (child.h, child))
+            open_node = open_list.get(child.state)
+            priority = child.h * h_weight + child.g * g_weight
+            if (
+                open_node is None
+                or open_node.h * h_weight + open_node.g * g_weight > priority
+            ):
+                if table is not None:
+                    set_checkpoint(child)
+                open_list.push(child.state, child, priority)
 
-        max_states_in_memory = max(
-            max_states_in_memory, len(open_dict) + len(closed_dict)
-        )
+        max_states_in_memory = max(max_states_in_memory, len(open_list) + len(closed))
+        if telemetry is not None:
+            telemetry.update(
+                total_opened_states,
+                len(open_list),
+                len(closed),
+                current_node.h,
+                open_list.stale_pops,
+            )
 
+    return None
 
-def a_star_search(puzzle, goal):
-    Node.set_comparison_criteria("f")
-    start_node = Node(puzzle, 0, None, goal)
-    open_list = []
-    heapq.heappush(open_list, start_node)
-    open_dict = {}
-    open_dict[start_node.puzzle] = start_node.f
+
+def batched_greedy_search(puzzle, goal):
+    """
+    子Nodeをまとめて生成する貪欲最良優先探索(BATCH_SIZE個ずつ展開する)
+    """
+    return greedy_best_first_search(puzzle, goal, BATCH_SIZE)
+
+
+def get_weight_ratio(weight):
+    """
+    重みを整数の比(分子, 分母)にする
+    バケットキューの優先度は整数でなければならないため、g*分母 + h*分子 を優先度とする
+    """
+    weight = Fraction(weight).limit_denominator(WEIGHT_DENOMINATOR)
+    if weight < 1:
+        raise ValueError("weight must be at least 1")
+    return weight.numerator, weight.denominator
+
+
+def a_star_search(puzzle, goal, weight=1, table_memory=None):
+    """
+    A*探索
+    weight > 1 の場合は重み付きA*探索(優先度: g + weight*h)になる
+    最適解は保証されなくなるが、解の手数は最適解のweight倍以下に収まり、展開するNodeは大きく減る
+    table_memory(MB)を指定した場合は、閉じた状態の辞書の代わりに大きさが固定の置換表を使う
+    (置換表のg値以上で再び生成された状態を除く。追い出された状態は再び展開されることがあるが、
+     重みが1なら最適解を返すことは変わらない)
+    """
+    numerator, denominator = get_weight_ratio(weight)
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    # 優先度が同じ場合はh値が小さい方を優先する
+    open_list = BucketQueue()
+    open_list.push(
+        start_node.state,
+        start_node,
+        start_node.g * denominator + start_node.h * numerator,
+        start_node.h,
+    )
     closed_dict = {}
     total_opened_states = 0
     max_states_in_memory = 0
+    telemetry = Telemetry.active
+    table = make_transposition_table(table_memory)
+    closed = closed_dict if table is None else table
 
     while open_list:
-        current_node = heapq.heappop(open_list)
+        current_node = open_list.pop()
         total_opened_states += 1
 
-        if current_node.puzzle == goal.goal_puzzle:
-            print_result(current_node, total_opened_states, max_states_in_memory)
-            return
+        if current_node.state == goal.goal_state:
+            if table is None:
+                return (
+                    trace_moves(current_node, closed_dict),
+                    total_opened_states,
+                    max_states_in_memory,
+                )
+            moves, retraced_states = trace_table(current_node, table, goal)
+            return moves, total_opened_states + retraced_states, max_states_in_memory
 
-        open_dict.pop(current_node.puzzle, None)
-        closed_dict[current_node.puzzle] = current_node
+        if table is None:
+            # 閉じた状態には最後の手だけを残し、親Nodeへの参照を切る
+            # (解の手順はtrace_movesで復元できるので、展開済みのNodeを残さなくてよい)
+            closed_dict[current_node.state] = current_node.move
+            current_node.parent = None
+        else:
+            table.store(current_node.state, current_node.g, current_node.move)
 
         for child in current_node.get_children():
-            if child.puzzle in closed_dict:
-                continue
-            if child.puzzle in open_dict:
-                if open_dict[child.puzzle] > child.f:
-                    heapq.heappush(open_list, child)
-                    open_dict[child.puzzle] = child.f
+            if table is None:
+                if child.state in closed_dict:
+                    continue
             else:
-                heapq.heappush(open_list, child)
-                open_dict[child.puzzle] = child.f
+                closed_g = table.get(child.state)
+                if closed_g is not None and closed_g <= child.g:
+                    continue
+            open_node = open_list.get(child.state)
+            if open_node is None or open_node.f > child.f:
+                if table is not None:
+                    set_checkpoint(child)
+                open_list.push(
+                    child.state,
+                    child,
+                    child.g * denominator + child.h * numerator,
+                    child.h,
+                )
+
+        max_states_in_memory = max(max_states_in_memory, len(open_list) + len(closed))
+        if telemetry is not None:
+            telemetry.update(
+                total_opened_states,
+                len(open_list),
+                len(closed),
+                current_node.f,
+                open_list.stale_pops,
+            )
+
+    return None
+
+
+def weighted_a_star_search(puzzle, goal):
+    """
+    重み付きA*探索(重みはWEIGHT)
+    """
+    return a_star_search(puzzle, goal, WEIGHT)
+
+
+def anytime_a_star_search(
+    puzzle, goal, weight=ANYTIME_WEIGHT, time_budget=None, on_solution=None
+):
+    """
+    ARA*(Anytime Repairing A*)による探索
+    1. 大きな重みの重み付きA*探索で、まず解を1つ見つける
+    2. 重みをWEIGHT_STEPずつ下げながら、前回までの探索結果を使い回して解を改善する
+       - 今回の探索で閉じた状態のg値が小さくなった場合は、再展開せずにinconsistentな状態として残し、
+         次に重みを下げる時に展開待ちのリストに戻す
+    3. 重みが1の探索が終わるか、制限時間(time_budget秒、NoneならTIME_BUDGET秒)を過ぎたら最後の解を返す
+       (最初の解が見つかるまでは制限時間を過ぎても探索を続ける)
+    解が改善されるたびに on_solution(手順, 時間計算量, 空間計算量, 準最適性の上限) を呼ぶ
+    準最適性の上限: 解の手数 / 最適解の手数の下限(展開待ちの状態のg+hの最小値) で、重みより小さいこともある
+    """
+    numerator, denominator = get_weight_ratio(weight)
+    step = Fraction(WEIGHT_STEP).limit_denominator(WEIGHT_DENOMINATOR)
+    if time_budget is None:
+        time_budget = TIME_BUDGET
+    deadline = time.perf_counter() + time_budget
+
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    if start_node.state == goal.goal_state:
+        if on_solution is not None:
+            on_solution("", 0, 0, Fraction(1))
+        return "", 0, 0
+
+    # 状態ごとの最良のg値と、その状態にした手(解の手順はtrace_movesで復元する)
+    g_dict = {start_node.state: 0}
+    move_dict = {start_node.state: None}
+    open_list = BucketQueue()
+    inconsistent_dict = {start_node.state: start_node}
+    total_opened_states = 0
+    max_states_in_memory = 0
+    telemetry = Telemetry.active
+    solution = None
+    goal_g = float("inf")
+
+    while True:
+        # 重みを変えたので、展開待ちの状態を新しい優先度で入れ直す
+        nodes = list(open_list.entries.values()) + list(inconsistent_dict.values())
+        open_list = BucketQueue()
+        for node in nodes:
+            open_list.push(
+                node.state, node, node.g * denominator + node.h * numerator, node.h
+            )
+        inconsistent_dict = {}
+        closed_set = set()
+
+        while open_list and open_list.peek_priority() < goal_g * denominator:
+            if solution is not None and time.perf_counter() > deadline:
+                return solution[:3]
+            current_node = open_list.pop()
+            total_opened_states += 1
+            closed_set.add(current_node.state)
+
+            for child in current_node.get_children():
+                if g_dict.get(child.state, float("inf")) <= child.g:
+                    continue
+                g_dict[child.state] = child.g
+                move_dict[child.state] = child.move
+                # 閉じた状態への参照は手の辞書で足りるので、親Nodeへの参照を切る
+                child.parent = None
+                if child.state == goal.goal_state:
+                    goal_g = child.g
+                    goal_node = child
+                if child.state in closed_set:
+                    inconsistent_dict[child.state] = child
+                else:
+                    open_list.push(
+                        child.state,
+                        child,
+                        child.g * denominator + child.h * numerator,
+                        child.h,
+                    )
+
+            max_states_in_memory = max(max_states_in_memory, len(g_dict))
+            if telemetry is not None:
+                telemetry.update(
+                    total_opened_states,
+                    len(open_list) + len(inconsistent_dict),
+                    len(closed_set),
+                    current_node.f,
+                    open_list.stale_pops,
+                )
+
+        if goal_g == float("inf"):
+            return None
+
+        lower_bound = min(
+            (node.f for node in open_list.entries.values()), default=goal_g
+        )
+        lower_bound = min(
+            [lower_bound] + [node.f for node in inconsistent_dict.values()]
+        )
+        bound = min(Fraction(numerator, denominator), Fraction(goal_g, lower_bound))
+        if solution is None or goal_g < len(solution[0]) or bound < solution[3]:
+            solution = (
+                trace_moves(goal_node, move_dict),
+                total_opened_states,
+                max_states_in_memory,
+                bound,
+            )
+            if on_solution is not None:
+                on_solution(*solution)
+
+        if numerator == denominator or time.perf_counter() > deadline:
+            return solution[:3]
+        weight = max(Fraction(1), Fraction(numerator, denominator) - step)
+        numerator, denominator = weight.numerator, weight.denominator
+
+
+def set_anytime_time_budget(time_budget):
+    """
+    ARA*の制限時間(秒)の既定値を変える
+    (ALGORITHMSから引数なしで呼ばれる場合に使うため、benchmarkのワーカープロセスの初期化で設定する)
+    """
+    global TIME_BUDGET
+    TIME_BUDGET = time_budget
+
+
+def get_ida_priority(node):
+    """
+    IDA*で子Nodeを展開する順番(f値が同じ場合はh値が小さい方から展開する)
+    """
+    return node.f, node.h
+
+
+def bounded_depth_first_search(
+    root_node, bound, path_set, total_opened_states=0, stop_event=None, table=None
+):
+    """
+    root_nodeから、f値がboundを超えないNodeだけを深さ優先で展開する(IDA*の1回分の探索)
+        path_set = 経路上のパズル(ループ防止用、root_nodeまでの状態を含む)
+        total_opened_states = これまでに展開したNodeの数(展開するたびに加算して返す)
+        stop_event = セットされたら探索を打ち切るイベント(並列IDA*で使う)
+        table = 今回の閾値で展開した状態の置換表(Noneなら使わない)
+                同じ閾値で、同じかより小さいg値で展開済みの状態は、部分木を探索済みなので展開しない
+    戻り値: (ゴールのNode(見つからなければNone), 閾値を超えたf値の最小値, 展開したNodeの数, スタックの最大の深さ)
+    """
+    goal_state = Node.goal.goal_state
+    telemetry = Telemetry.active
+    next_bound = float("inf")
+    max_depth = 0
+    # 各Nodeの未展開の子Nodeのスタック
+    stack = [(root_node, iter(sorted(root_node.get_children(), key=get_ida_priority)))]
+
+    while stack:
+        current_node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            path_set.discard(current_node.state)
+            continue
+        if child.state in path_set:
+            continue
+        if child.state == goal_state:
+            total_opened_states += 1
+            return child, next_bound, total_opened_states, max_depth
+        if child.f > bound:
+            next_bound = min(next_bound, child.f)
+            continue
+        if table is not None:
+            closed_g = table.get(child.state)
+            if closed_g is not None and closed_g <= child.g:
+                continue
+            table.store(child.state, child.g)
 
+        total_opened_states += 1
+        path_set.add(child.state)
+        stack.append((child, iter(sorted(child.get_children(), key=get_ida_priority))))
+        max_depth = max(max_depth, len(stack))
+        if telemetry is not None:
+            # IDA*は展開待ちのリストを持たないので、スタックの深さと経路上の状態の数を渡す
+            telemetry.update(total_opened_states, len(stack), len(path_set), bound)
+        if (
+            stop_event is not None
+            and total_opened_states % STOP_CHECK_INTERVAL == 0
+            and stop_event.is_set()
+        ):
+            break
+
+    return None, next_bound, total_opened_states, max_depth
+
+
+def ida_star_search(puzzle, goal, table_memory=None):
+    """
+    反復深化A*探索(IDA*)
+    1. 閾値(bound)をスタートNodeのf値で初期化する
+    2. f値が閾値を超えないNodeだけを深さ優先で展開する
+    3. ゴールが見つからなければ、閾値を超えたf値の最小値に更新して再探索する
+    メモリは現在の経路(解の深さ)に比例する分しか使わない
+    table_memory(MB)を指定した場合は、大きさが固定の置換表で、経路が違うだけの重複した展開を除く
+    (置換表は閾値を更新するたびに空にする。メモリは置換表の分だけ増える)
+    """
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    total_opened_states = 0
+    max_states_in_memory = 0
+    table = make_transposition_table(table_memory)
+
+    if start_node.state == goal.goal_state:
+        return "", total_opened_states, max_states_in_memory
+
+    bound = start_node.f
+    while True:
+        if table is not None:
+            table.clear()
+        goal_node, next_bound, total_opened_states, max_depth = (
+            bounded_depth_first_search(
+                start_node, bound, {start_node.state}, total_opened_states, table=table
+            )
+        )
         max_states_in_memory = max(
-            max_states_in_memory, len(open_dict) + len(closed_dict)
+            max_states_in_memory, max_depth + (len(table) if table is not None else 0)
         )
+        if goal_node is not None:
+            return get_path_moves(goal_node), total_opened_states, max_states_in_memory
+        if next_bound == float("inf"):
+            return None
+        bound = next_bound
 
 
-def check_solvable(puzzle, goal):
+# 並列IDA*のワーカープロセスで、探索の打ち切りを知らせるイベント
+_stop_event = None
+
+
+def init_parallel_worker(goal, heuristic_function, stop_event):
     """
-    下記の二つの偶奇が一致するかで、パズルが解けるかどうかを判定する
-    ①パズル内の各マス目位置を交換する回数の偶奇
-    ②空白マスの位置とゴールの空白マスの位置のマンハッタン距離の偶奇
+    並列IDA*のワーカープロセスの初期化(ゴールとヒューリスティック関数を親プロセスと揃える)
     """
-    n = Node(puzzle, 0, None, goal)
-        
-    diff_all = 0
-    puzzle_list = []
-    goal_list = []
+    global _stop_event
+    Node.set_goal(goal)
+    Node.set_heuristic_function(heuristic_function)
+    _stop_event = stop_event
 
-    for line in puzzle:
-        puzzle_list += line
-    for line in goal.goal_puzzle:
-        goal_list += line
 
-    for i in range(len(puzzle_list)):
-        for j in range(i, len(puzzle_list)):
-            if goal_list.index(puzzle_list[i]) > goal_list.index(puzzle_list[j]):
-                puzzle_list[j], puzzle_list[i] = puzzle_list[i], puzzle_list[j]
-                diff_all += 1
+def solve_subtree(state, depth, move, bound, path_states):
+    """
+    ワーカープロセスで、1つの部分木を閾値boundで探索する
+    戻り値: (部分木の根からゴールまでの手順(見つからなければNone), 閾値を超えたf値の最小値,
+             展開したNodeの数, スタックの最大の深さ)
+    """
+    root_node = Node(state, depth, None, move=move)
+    goal_node, next_bound, total_opened_states, max_depth = bounded_depth_first_search(
+        root_node, bound, set(path_states), 0, _stop_event
+    )
+    if goal_node is None:
+        return None, next_bound, total_opened_states, max_depth
+    moves = []
+    while goal_node is not root_node:
+        moves.append(goal_node.move)
+        goal_node = goal_node.parent
+    moves.reverse()
+    return "".join(moves), next_bound, total_opened_states, max_depth
 
-    empty_row, empty_col = n.find_empty_space(puzzle)
-    diff_empty = abs(empty_row - goal.goal_empty_row) + abs(empty_col - goal.goal_empty_col)
 
-    if diff_all % 2 == diff_empty % 2:
-        return True
-    else:
+def parallel_ida_star_search(puzzle, goal, workers=None):
+    """
+    並列IDA*探索(1つのパズルを複数のプロセスで探索する)
+    1. スタートから幅優先で展開し、ワーカーの数のPARALLEL_SPLIT_FACTOR倍以上の部分木の根を作る
+    2. 閾値ごとに、f値が閾値を超えない部分木をf値の小さい順にワーカープールに渡す
+       (部分木はワーカーの数より十分多いので、早く終わったワーカーが次の部分木を取っていく)
+    3. どれかの部分木でゴールが見つかったら、イベントで全てのワーカーに打ち切りを知らせる
+    4. 全ての部分木でゴールが見つからなければ、閾値を超えたf値の最小値に更新して繰り返す
+    最適性: 前回の閾値までの部分木は全て探索し終えているので、閾値未満の解はない。
+    今回の閾値で見つかった解は手数が閾値以下なので、どの部分木で見つかった解も最適解になる
+    """
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    total_opened_states = 0
+    max_states_in_memory = 0
+    telemetry = Telemetry.active
+
+    if start_node.state == goal.goal_state:
+        return "", total_opened_states, max_states_in_memory
+
+    workers = workers or os.cpu_count() or 1
+    # 部分木の根と、スタートからその根までの経路上の状態
+    frontier = [(start_node, (start_node.state,))]
+    while len(frontier) < PARALLEL_SPLIT_FACTOR * workers:
+        next_frontier = []
+        seen = set()
+        for current_node, path_states in frontier:
+            total_opened_states += 1
+            for child in current_node.get_children():
+                if child.state == goal.goal_state:
+                    # 幅優先で1層ずつ展開しているので、最初に見つかったゴールが最短
+                    return get_path_moves(child), total_opened_states, len(frontier)
+                if child.state in seen or child.state in path_states:
+                    continue
+                seen.add(child.state)
+                next_frontier.append((child, path_states + (child.state,)))
+        frontier = next_frontier
+    frontier.sort(key=lambda item: get_ida_priority(item[0]))
+    max_states_in_memory = len(frontier)
+
+    stop_event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_parallel_worker,
+        initargs=(goal, Node.heuristic_function, stop_event),
+    )
+    try:
+        bound = start_node.f
+        while True:
+            next_bound = float("inf")
+            futures = {}
+            for root_node, path_states in frontier:
+                if root_node.f > bound:
+                    next_bound = min(next_bound, root_node.f)
+                    continue
+                future = executor.submit(
+                    solve_subtree,
+                    root_node.state,
+                    root_node.g,
+                    root_node.move,
+                    bound,
+                    path_states,
+                )
+                futures[future] = root_node
+
+            for finished, future in enumerate(as_completed(futures), 1):
+                moves, subtree_bound, opened_states, max_depth = future.result()
+                total_opened_states += opened_states
+                max_states_in_memory = max(
+                    max_states_in_memory, len(frontier) + max_depth
+                )
+                next_bound = min(next_bound, subtree_bound)
+                if telemetry is not None:
+                    telemetry.update(
+                        total_opened_states, len(futures) - finished, 0, bound
+                    )
+                if moves is not None:
+                    return (
+                        get_path_moves(futures[future]) + moves,
+                        total_opened_states,
+                        max_states_in_memory,
+                    )
+
+            if next_bound == float("inf"):
+                return None
+            bound = next_bound
+    finally:
+        # 解が見つかった場合や、タイムアウトなどで中断した場合に、探索中のワーカーを止める
+        stop_event.set()
+        executor.shutdown(cancel_futures=True)
+
+
+def bidirectional_search(puzzle, goal):
+    """
+    双方向幅優先探索
+    1. スタートとゴールの両方から、1手ずつ(1層ずつ)幅優先で展開する
+    2. 毎回、展開待ちの状態が少ない方の層を展開する
+    3. 相手側の辞書にある状態を生成したら、両側の経路がつながったとみなす
+    4. その層を最後まで展開し、つながった経路のうち最も短いものを解とする
+    (移動のコストはすべて1なので、この時点で見つかった最短の経路が最適解になる)
+    """
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    total_opened_states = 0
+    max_states_in_memory = 0
+
+    if start_node.state == goal.goal_state:
+        return "", total_opened_states, max_states_in_memory
+
+    telemetry = Telemetry.active
+    goal_node = Node(goal.goal_state, 0, None)
+    forward_dict = {start_node.state: start_node}
+    backward_dict = {goal_node.state: goal_node}
+    forward_frontier = [start_node]
+    backward_frontier = [goal_node]
+
+    while forward_frontier and backward_frontier:
+        if len(forward_frontier) <= len(backward_frontier):
+            frontier, own_dict, other_dict = (
+                forward_frontier, forward_dict, backward_dict
+            )
+        else:
+            frontier, own_dict, other_dict = (
+                backward_frontier, backward_dict, forward_dict
+            )
+
+        next_frontier = []
+        best_pair = None
+        best_cost = float("inf")
+        for current_node in frontier:
+            total_opened_states += 1
+            for child in current_node.get_children():
+                if child.state in own_dict:
+                    continue
+                own_dict[child.state] = child
+                next_frontier.append(child)
+                other_node = other_dict.get(child.state)
+                if other_node is not None and child.g + other_node.g < best_cost:
+                    best_cost = child.g + other_node.g
+                    best_pair = (child, other_node)
+            if telemetry is not None:
+                telemetry.update(
+                    total_opened_states,
+                    len(frontier) + len(next_frontier),
+                    len(forward_dict) + len(backward_dict),
+                    current_node.g + 1,
+                )
+
+        max_states_in_memory = max(
+            max_states_in_memory, len(forward_dict) + len(backward_dict)
+        )
+
+        if best_pair is not None:
+            if own_dict is forward_dict:
+                forward_node, backward_node = best_pair
+            else:
+                backward_node, forward_node = best_pair
+            return (
+                join_paths(forward_node, backward_node),
+                total_opened_states,
+                max_states_in_memory,
+            )
+
+        if own_dict is forward_dict:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return None
+
+
+def external_search(
+    puzzle, goal, memory_limit=EXTERNAL_MEMORY_LIMIT, work_directory=None
+):
+    """
+    外部メモリ探索(遅延重複検出付きの幅優先ヒューリスティック探索を、閾値を上げながら繰り返す)
+    展開待ちの状態も閉じた状態もメモリに置かず、深さごとの層としてディスクのファイルに書き出す
+    1. 閾値(bound)をスタートNodeのf値で初期化する
+    2. 深さdの層のファイルを先頭から読み、f値が閾値を超えない子Nodeを次の層に集める
+       (メモリ上の状態がmemory_limit(MB)分を超えたら、ソートしてディスクに書き出す)
+    3. 集めた状態を併合して重複を除き、深さd-1の層にある状態も除く
+       (盤面は市松模様に塗り分けられ、1手で必ず色が変わるので、深さdの子は深さd-1かd+1にしかない)
+    4. ゴールを含む層が見つかったら、層を逆にたどって手順を復元する
+    5. 層が空になったら、閾値を超えたf値の最小値に更新して再探索する
+    層のファイルはwork_directory(NoneならEXTERNAL_WORK_DIRECTORY)の下の一時ディレクトリに置く
+    空間計算量は、メモリ上にためた状態の数の最大値を返す
+    """
+    Node.set_goal(goal)
+    start_node = Node(goal.pack_puzzle(puzzle), 0, None)
+    total_opened_states = 0
+    max_states_in_memory = 0
+    telemetry = Telemetry.active
+
+    if start_node.state == goal.goal_state:
+        return "", total_opened_states, max_states_in_memory
+
+    size = goal.size
+    record_size = get_record_size(size)
+    capacity = max(1, memory_limit * 1024 * 1024 // EXTERNAL_BYTES_PER_STATE)
+    goal_record = encode_state(goal.goal_state)
+    bound = start_node.f
+
+    if work_directory is None:
+        work_directory = EXTERNAL_WORK_DIRECTORY
+    os.makedirs(work_directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="npuzzle-", dir=work_directory) as directory:
+        while True:
+            next_bound = float("inf")
+            writer = LayerWriter(os.path.join(directory, "0"), record_size, capacity)
+            writer.add(encode_state(start_node.state))
+            layers = [writer.finish()]
+
+            while len(layers[-1]) and goal_record not in layers[-1]:
+                depth = len(layers) - 1
+                writer = LayerWriter(
+                    os.path.join(directory, str(depth + 1)), record_size, capacity
+                )
+                for record in layers[-1]:
+                    current_node = Node(decode_state(record, size), depth, None)
+                    total_opened_states += 1
+                    for child in current_node.get_children():
+                        if child.f > bound:
+                            next_bound = min(next_bound, child.f)
+                            continue
+                        writer.add(encode_state(child.state))
+                    if telemetry is not None:
+                        telemetry.update(
+                            total_opened_states,
+                            len(layers[-1]),
+                            len(writer.buffer),
+                            bound,
+                        )
+                layers.append(writer.finish(layers[-2] if depth > 0 else None))
+                max_states_in_memory = max(max_states_in_memory, writer.peak)
+
+            if len(layers[-1]):
+                moves = trace_layers(layers, goal.goal_state, size)
+                for layer in layers:
+                    layer.close()
+                return moves, total_opened_states, max_states_in_memory
+
+            for layer in layers:
+                layer.delete()
+            if next_bound == float("inf"):
+                return None
+            bound = next_bound
+
+
+def set_external_work_directory(work_directory):
+    """
+    外部メモリ探索が層のファイルを書き出すディレクトリの既定値を変える
+    (ALGORITHMSから引数なしで呼ばれる場合に使うため、batch・serviceのワーカープロセスの初期化で設定する)
+    """
+    global EXTERNAL_WORK_DIRECTORY
+    EXTERNAL_WORK_DIRECTORY = work_directory
+
+
+def trace_layers(layers, state, size):
+    """
+    最後の層にあるstateから、1つ前の層にある隣の状態を順にたどって、スタートからの手順の文字列を作る
+    """
+    moves = []
+    empty_space = Node.goal.get_tiles(state).index(0)
+    for layer in reversed(layers[:-1]):
+        for move, target in Node.move_table[empty_space]:
+            parent_state = Node.get_child_state(state, empty_space, target)
+            if encode_state(parent_state) in layer:
+                # 親の状態からstateにする手は、stateから親の状態にする手の逆向き
+                moves.append(Node.INVERSE_MOVES[move])
+                state, empty_space = parent_state, target
+                break
+    moves.reverse()
+    return "".join(moves)
+
+
+def decomposition_search(puzzle, goal):
+    """
+    分割統治による大きな盤面(6x6以上)の高速な探索(手数は最適とは限らない)
+    螺旋状のゴールの外周のタイルから順に、小さな探索で1枚ずつ置いて固定し、内側の盤面に進む
+    (詳細はDecompositionSolverを参照、ヒューリスティック関数は使わない)
+    時間計算量・空間計算量は、部分問題の探索で展開した状態の数の合計と、保持した状態の数の最大値を返す
+    """
+    solver = DecompositionSolver(goal)
+    moves = solver.solve(puzzle)
+    if moves is None:
+        return None
+    return moves, solver.opened_states, solver.max_states
+
+
+def join_paths(forward_node, backward_node):
+    """
+    スタートからの経路とゴールからの経路をつなげて、手順の文字列を作る
+    ゴール側の手は、ゴールから出会った状態へ向かう手なので、逆向きにして後ろにつなげる
+    """
+    moves = [get_path_moves(forward_node)]
+    while backward_node.move is not None:
+        moves.append(Node.INVERSE_MOVES[backward_node.move])
+        backward_node = backward_node.parent
+    return "".join(moves)
+
+
+# 非対話的な入口(batch.pyなど)から使う探索アルゴリズムとヒューリスティック関数の名前
+ALGORITHMS = {
+    "astar": a_star_search,
+    "weighted_astar": weighted_a_star_search,
+    "anytime_astar": anytime_a_star_search,
+    "greedy": greedy_best_first_search,
+    "greedy_batch": batched_greedy_search,
+    "ucs": uniform_cost_search,
+    "idastar": ida_star_search,
+    "parallel_idastar": parallel_ida_star_search,
+    "bidirectional": bidirectional_search,
+    "external": external_search,
+    "decomposition": decomposition_search,
+}
+HEURISTICS = ("manhattan", "hamming", "linear_conflict", "pattern_database")
+
+
+def check_solvable(puzzle, goal):
+    """
+    パズル(行のタプル)が解けるかどうかを判定する(判定方法はGoal.is_solvableを参照)
+    """
+    if len(puzzle) != goal.size or any(len(row) != goal.size for row in puzzle):
         return False
+    return goal.is_solvable([cell for row in puzzle for cell in row])
+
+
+def check_solvable_batch(puzzles, goal):
+    """
+    同じサイズの多数のパズルをまとめて判定し、解けるかどうかのリストを返す
+    探索を始める前に、バッチ処理の入力をふるい分けるために使う
+    """
+    return [check_solvable(puzzle, goal) for puzzle in puzzles]
 
 
 def main():
     parser = argparse.ArgumentParser(description="Solve N-Puzzle problem.")
+    parser.add_argument(
+        "-o", "--output", default="result", help="file the solution is written to"
+    )
+    parser.add_argument(
+        "-f", "--format", choices=["boards", "moves", "json"], default="boards",
+        help="write every board, only the U/D/L/R move string, or JSON",
+    )
+    parser.add_argument(
+        "--memory-budget", type=int, default=EXTERNAL_MEMORY_LIMIT,
+        help="MB of states External Memory Search keeps in RAM before spilling to disk",
+    )
+    parser.add_argument(
+        "--work-directory", default=EXTERNAL_WORK_DIRECTORY,
+        help="directory External Memory Search writes its layer files to"
+        " (keep it on disk, not on a RAM-backed tmpfs)",
+    )
+    parser.add_argument(
+        "--transposition-table", type=int, nargs="?", const=TRANSPOSITION_TABLE_LIMIT,
+        default=None, metavar="MB",
+        help="bound the closed set of A*, Weighted A*, Greedy and IDA* Search"
+        " with a fixed-size transposition table of this many MB",
+    )
+    parser.add_argument(
+        "--telemetry", default=None,
+        help="stream search metrics to this JSON lines file while solving",
+    )
+    parser.add_argument(
+        "--profile-after", type=float, default=None,
+        help="with --telemetry, dump cProfile/tracemalloc snapshots"
+        " when the search runs longer than this many seconds",
+    )
+    args = parser.parse_args()
 
      # Question 1
     print("\033[95m" + 
@@ -246,7 +1151,15 @@ def main():
     elif choice == '2':
         print("\033[95m" + 
               "\033[1mRandom choice\033[0m" + "\033[0m")
-        file_path = generate_random_puzzle_file()
+        print("\033[95m" + "Please enter the puzzle size (default 3):" + "\033[0m")
+        try:
+            size = int(input().strip() or 3)
+        except ValueError:
+            size = 0
+        if size < 2:
+            print("Error: Invalid size. Please enter a number of at least 2.")
+            return
+        file_path = generate_random_puzzle_file(size)
     else:
         print("Error: Invalid choice. Please enter '\033[1m\033[95mf\033[0m\033[95m' or '\033[1m\033[95mr\033[0m\033[95m'.")
         return
@@ -263,7 +1176,7 @@ def main():
     print(
         "\033[93m"
         + "\nWhich algorithm would you like to use?\n"
-        + "'\033[1m\033[93m1\033[0m\033[93m': A* Search\n'\033[1m\033[93m2\033[0m\033[93m': Greedy Best-First Search\n'\033[1m\033[93m3\033[0m\033[93m': Uniform Cost Search\n'\033[1m\033[93m4\033[0m\033[93m': Random"
+        + "'\033[1m\033[93m1\033[0m\033[93m': A* Search\n'\033[1m\033[93m2\033[0m\033[93m': Greedy Best-First Search\n'\033[1m\033[93m3\033[0m\033[93m': Uniform Cost Search\n'\033[1m\033[93m4\033[0m\033[93m': Random\n'\033[1m\033[93m5\033[0m\033[93m': IDA* Search\n'\033[1m\033[93m6\033[0m\033[93m': Bidirectional Search\n'\033[1m\033[93m7\033[0m\033[93m': Weighted A* Search\n'\033[1m\033[93m8\033[0m\033[93m': Anytime A* Search\n'\033[1m\033[93m9\033[0m\033[93m': External Memory Search\n'\033[1m\033[93m10\033[0m\033[93m': Parallel IDA* Search\n'\033[1m\033[93m11\033[0m\033[93m': Decomposition Search"
         + "\033[0m"
     )
     algorithm_choice = input().strip().lower()
@@ -276,26 +1189,59 @@ def main():
             print("Error: A* Search is not allowed for puzzles of size 4x4 or larger.")
             return
         print("\033[93m" + "\033[1mA* Search\033[0m" + "\033[0m")
-        Node.set_comparison_criteria("f")
     elif algorithm_choice == "2":
         print("\033[93m" + "\033[1mGreedy Search\033[0m" + "\033[0m")
-        Node.set_comparison_criteria("h")
     elif algorithm_choice == "3":
         if size >= 4:
             print("Error: Uniform Cost Search is not allowed for puzzles of size 4x4 or larger.")
             return
         print("\033[93m" + "\033[1mUniform Cost Search\033[0m" + "\033[0m")
-        Node.set_comparison_criteria("g")
+    elif algorithm_choice == "5":
+        # IDA*は経路分のメモリしか使わないため、4x4以上でも最適解を探索できる
+        print("\033[93m" + "\033[1mIDA* Search\033[0m" + "\033[0m")
+    elif algorithm_choice == "6":
+        print("\033[93m" + "\033[1mBidirectional Search\033[0m" + "\033[0m")
+    elif algorithm_choice == "7":
+        # 重み付きA*は解の手数を最適解の重み倍以下に保ちながら、4x4以上でも短時間で探索できる
+        print("\033[93m" + "\033[1mWeighted A* Search\033[0m" + "\033[0m")
+        print("\033[93m" + f"Please enter the weight (default {WEIGHT}):" + "\033[0m")
+        try:
+            weight = float(input().strip() or WEIGHT)
+            get_weight_ratio(weight)
+        except (ValueError, OverflowError):
+            print("Error: Invalid weight. Please enter a number of at least 1.")
+            return
+    elif algorithm_choice == "8":
+        print("\033[93m" + "\033[1mAnytime A* Search\033[0m" + "\033[0m")
+        print(
+            "\033[93m"
+            + f"Please enter the time budget in seconds (default {TIME_BUDGET}):"
+            + "\033[0m"
+        )
+        try:
+            time_budget = float(input().strip() or TIME_BUDGET)
+        except ValueError:
+            print("Error: Invalid time budget.")
+            return
+    elif algorithm_choice == "9":
+        # 外部メモリ探索は状態をディスクに書き出すため、4x4以上でもメモリを使い切らずに最適解を探索できる
+        print("\033[93m" + "\033[1mExternal Memory Search\033[0m" + "\033[0m")
+    elif algorithm_choice == "10":
+        # 1つのパズルの探索木を分けて、CPUコアの数だけのプロセスで探索する
+        print("\033[93m" + "\033[1mParallel IDA* Search\033[0m" + "\033[0m")
+    elif algorithm_choice == "11":
+        # 外周から1枚ずつタイルを置いていくため、6x6以上の盤面も短時間で解ける(手数は最適とは限らない)
+        print("\033[93m" + "\033[1mDecomposition Search\033[0m" + "\033[0m")
     else:
         print("Error: Invalid algorithm choice.")
         return
 
-    if algorithm_choice in ["1", "2"]:
+    if algorithm_choice in ["1", "2", "5", "7", "8", "9", "10"]:
         # Question 3
         print(
             "\033[96m"
             + "\nWhich heuristic function would you like to use?\n"
-            + "'\033[1m\033[96m1\033[0m\033[96m': Manhattan\n'\033[1m\033[96m2\033[0m\033[96m': Hamming\n'\033[1m\033[96m3\033[0m\033[96m': Linear Conflict\n'\033[1m\033[96m4\033[0m\033[96m': Random"
+            + "'\033[1m\033[96m1\033[0m\033[96m': Manhattan\n'\033[1m\033[96m2\033[0m\033[96m': Hamming\n'\033[1m\033[96m3\033[0m\033[96m': Linear Conflict\n'\033[1m\033[96m4\033[0m\033[96m': Random\n'\033[1m\033[96m5\033[0m\033[96m': Pattern Database"
             + "\033[0m"
         )
         heuristic_choice = input().strip().lower()
@@ -312,19 +1258,77 @@ def main():
         elif heuristic_choice == "3":
             print("\033[96m" + "\033[1mLinear_conflict\033[0m" + "\033[0m")
             Node.set_heuristic_function("linear_conflict")
+        elif heuristic_choice == "5":
+            if size not in PatternDatabase.DEFAULT_PARTITIONS:
+                print("Error: Pattern Database is not available for this puzzle size.")
+                return
+            print("\033[96m" + "\033[1mPattern Database\033[0m" + "\033[0m")
+            Node.set_heuristic_function("pattern_database")
         else:
             print("Error: Invalid heuristic choice.")
             return
 
-    if algorithm_choice == "1":
-        a_star_search(puzzle, goal)
-    elif algorithm_choice == "2":
-        greedy_best_first_search(puzzle, goal)
-    elif algorithm_choice == "3":
-        uniform_cost_search(puzzle, goal)
-    else:
-        print("Error: Invalid algorithm choice.")
+    # --telemetryを指定した場合だけ、探索中の計測値を書き出す
+    telemetry = (
+        Telemetry(args.telemetry, profile_after=args.profile_after)
+        if args.telemetry
+        else nullcontext()
+    )
+    with telemetry:
+        if algorithm_choice == "1":
+            result = a_star_search(
+                puzzle, goal, table_memory=args.transposition_table
+            )
+        elif algorithm_choice == "2":
+            result = greedy_best_first_search(
+                puzzle, goal, table_memory=args.transposition_table
+            )
+        elif algorithm_choice == "3":
+            result = uniform_cost_search(puzzle, goal)
+        elif algorithm_choice == "5":
+            result = ida_star_search(
+                puzzle, goal, table_memory=args.transposition_table
+            )
+        elif algorithm_choice == "6":
+            result = bidirectional_search(puzzle, goal)
+        elif algorithm_choice == "9":
+            result = external_search(
+                puzzle, goal, args.memory_budget, args.work_directory
+            )
+        elif algorithm_choice == "10":
+            result = parallel_ida_star_search(puzzle, goal)
+        elif algorithm_choice == "11":
+            result = decomposition_search(puzzle, goal)
+        elif algorithm_choice == "7":
+            result = a_star_search(
+                puzzle, goal, weight, table_memory=args.transposition_table
+            )
+            if result is not None:
+                print_result(puzzle, goal, *result, args.output, args.format, weight)
+                return
+        elif algorithm_choice == "8":
+
+            def on_solution(moves, total_opened_states, max_states_in_memory, bound):
+                # 解が改善されるたびに書き出す(制限時間内に見つかった最良の解がファイルに残る)
+                print(f"{len(moves)} moves (suboptimality bound: {float(bound):.3f})")
+                print_result(
+                    puzzle, goal, moves, total_opened_states, max_states_in_memory,
+                    args.output, args.format, bound,
+                )
+
+            result = anytime_a_star_search(
+                puzzle, goal, time_budget=time_budget, on_solution=on_solution
+            )
+            if result is not None:
+                return
+        else:
+            print("Error: Invalid algorithm choice.")
+            return
+
+    if result is None:
+        print("Error: No solution was found.")
         return
+    print_result(puzzle, goal, *result, args.output, args.format)
 
 
 if __name__ == "__main__":
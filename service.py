@@ -0,0 +1,252 @@
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from math import isqrt
+
+from PatternDatabase import PatternDatabase
+from SolutionCache import SolutionCache
+from batch import get_goal, init_worker, solve_puzzle
+from main import ALGORITHMS, HEURISTICS
+
+
+def init_service_worker(memory_limit, sizes, heuristic, work_directory=None):
+    """
+    サービスのワーカープロセスの初期化
+    batch.init_workerの設定に加えて、指定されたサイズのゴール(とパターンデータベース)を先に用意しておく
+    ワーカープロセスは終了するまで使い回すので、以降のリクエストではこれらを作り直さない
+    Ctrl-Cでの停止はメインプロセスが受け取り、ワーカープールを閉じる
+    """
+    init_worker(memory_limit, work_directory)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for size in sizes:
+        goal = get_goal(size)
+        if heuristic == "pattern_database" and size in PatternDatabase.DEFAULT_PARTITIONS:
+            PatternDatabase.load(goal)
+
+
+def parse_request(request, defaults):
+    """
+    JSONのリクエストを解釈して、solve_puzzleの引数を返す
+    リクエスト: {"id": 任意, "size": サイズ, "puzzle": 行のリスト または "board": 左上から順に並べたリスト,
+                 "algorithm": 探索アルゴリズム, "heuristic": ヒューリスティック関数, "timeout": 秒}
+    size, algorithm, heuristic, timeout は省略するとサイズは盤面から、それ以外は起動時の指定から決める
+    不正なリクエストの場合はValueError(またはTypeError)を送出する
+    """
+    if "puzzle" in request:
+        board = [tile for row in request["puzzle"] for tile in row]
+    elif "board" in request:
+        board = request["board"]
+    else:
+        raise ValueError("request needs a puzzle or a board")
+    if not all(isinstance(tile, int) for tile in board):
+        raise ValueError("tiles must be integers")
+    size = request.get("size", isqrt(len(board)))
+    if not isinstance(size, int) or size < 2 or len(board) != size * size:
+        raise ValueError("board does not match the size")
+    puzzle = tuple(tuple(board[i * size : (i + 1) * size]) for i in range(size))
+
+    algorithm = request.get("algorithm", defaults.algorithm)
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm: {algorithm}")
+    heuristic = request.get("heuristic", defaults.heuristic)
+    if heuristic not in HEURISTICS:
+        raise ValueError(f"unknown heuristic: {heuristic}")
+    timeout = request.get("timeout", defaults.timeout)
+    if timeout is not None and not isinstance(timeout, (int, float)):
+        raise ValueError("timeout must be a number of seconds")
+    return size, puzzle, algorithm, heuristic, timeout, defaults.cache
+
+
+def make_writer(stream):
+    """
+    応答を1行のJSONとしてstreamに書き出す関数を返す
+    応答は複数のスレッドから書き出されるので、ロックで1行ずつに区切る
+    """
+    lock = threading.Lock()
+
+    def write(response):
+        data = json.dumps(response) + "\n"
+        with lock:
+            try:
+                stream.write(data)
+                stream.flush()
+            except (OSError, ValueError):
+                # クライアントが先に接続を閉じた場合など
+                pass
+
+    return write
+
+
+class SolverService:
+    """
+    リクエストをワーカープールに渡し、解き終わった順に応答を書き出す
+    """
+
+    def __init__(self, executor, defaults):
+        """
+        サービスの初期化
+            executor = ワーカープール
+            defaults = 省略されたリクエストの項目に使う起動時の指定
+        """
+        self.executor = executor
+        self.defaults = defaults
+
+    def submit(self, line, write):
+        """
+        1行のリクエストをワーカープールに渡し、終わったらwriteで応答を書き出す
+        応答にはリクエストのidをつける(idがなければnull)
+        渡したFutureを返す(不正なリクエストの場合はすぐに応答を書き出してNoneを返す)
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.get("id")
+            arguments = parse_request(request, self.defaults)
+        except (ValueError, TypeError) as e:
+            write({"id": request_id, "status": "error", "error": str(e)})
+            return None
+
+        def respond(future):
+            try:
+                record = future.result()
+            except Exception as e:
+                # ワーカープロセスが落ちた場合など
+                record = {"status": "error", "error": repr(e)}
+            write({"id": request_id, **record})
+
+        future = self.executor.submit(solve_puzzle, *arguments)
+        future.add_done_callback(respond)
+        return future
+
+    def serve_stream(self, requests, responses):
+        """
+        requestsの各行をリクエストとして処理し、全ての応答を書き出すまで待つ
+        """
+        write = make_writer(responses)
+        futures = []
+        for line in requests:
+            if line.strip():
+                futures.append(self.submit(line, write))
+        wait([future for future in futures if future is not None])
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Unixソケットの1つの接続を処理する(接続ごとに別のスレッドで動く)
+    """
+
+    def handle(self):
+        requests = io.TextIOWrapper(self.rfile, encoding="utf-8")
+        responses = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+        self.server.service.serve_stream(requests, responses)
+
+
+def run_client(socket_path, requests, responses):
+    """
+    動作確認用のクライアント
+    requestsの各行をサービスに送り、サービスが接続を閉じるまで応答をresponsesに書き出す
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+
+        def send():
+            for line in requests:
+                if line.strip():
+                    client.sendall((line.rstrip("\n") + "\n").encode())
+            client.shutdown(socket.SHUT_WR)
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        with client.makefile("r") as reader:
+            for response in reader:
+                responses.write(response)
+                responses.flush()
+        sender.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep solver workers warm and answer JSON line requests"
+        " from stdin or a Unix socket."
+    )
+    parser.add_argument(
+        "--socket", default=None, help="listen on this Unix socket instead of stdin"
+    )
+    parser.add_argument(
+        "--connect", default=None,
+        help="act as a client: send stdin requests to this socket and print responses",
+    )
+    parser.add_argument(
+        "-a", "--algorithm", choices=ALGORITHMS, default="astar",
+        help="algorithm used when a request does not name one",
+    )
+    parser.add_argument(
+        "--heuristic", choices=HEURISTICS, default="manhattan",
+        help="heuristic used when a request does not name one",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-t", "--timeout", type=float, default=None,
+        help="seconds allowed per request when a request does not set one",
+    )
+    parser.add_argument(
+        "-m", "--memory-limit", type=int, default=None,
+        help="memory cap per worker process in MB",
+    )
+    parser.add_argument(
+        "--work-directory", default=None,
+        help="directory External Memory Search writes its layer files to",
+    )
+    parser.add_argument(
+        "-c", "--cache", nargs="?", const=SolutionCache.DEFAULT_PATH, default=None,
+        help="reuse and store solutions in this SQLite file",
+    )
+    parser.add_argument(
+        "--warm", type=int, nargs="*", default=[3, 4],
+        help="board sizes whose goal (and pattern database) each worker prepares",
+    )
+    args = parser.parse_args()
+
+    if args.connect:
+        run_client(args.connect, sys.stdin, sys.stdout)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=args.jobs,
+        initializer=init_service_worker,
+        initargs=(args.memory_limit, args.warm, args.heuristic, args.work_directory),
+    ) as executor:
+        service = SolverService(executor, args)
+        if args.socket is None:
+            service.serve_stream(sys.stdin, sys.stdout)
+            return
+
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        with socketserver.ThreadingUnixStreamServer(
+            args.socket, RequestHandler
+        ) as server:
+            server.service = service
+            print(f"listening on {args.socket}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()